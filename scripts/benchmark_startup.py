@@ -0,0 +1,46 @@
+"""Measure cold import time of each service entry point."""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+ENTRY_POINTS = {
+    "ingest": "src.ingest.mqtt_client",
+    "kpi": "src.processing.kpi_engine",
+    "api": "src.alerts.api",
+}
+
+IMPORT_SNIPPET = (
+    "import time; start = time.perf_counter(); import {module}; "
+    "print(time.perf_counter() - start)"
+)
+
+def measure(module: str, repeat: int) -> list:
+    """Import a module in fresh interpreters and return the elapsed seconds."""
+    timings = []
+    for _ in range(repeat):
+        result = subprocess.run(
+            [sys.executable, "-c", IMPORT_SNIPPET.format(module=module)],
+            cwd=PROJECT_ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        timings.append(float(result.stdout.strip().splitlines()[-1]))
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters per entry point")
+    args = parser.parse_args()
+
+    print(f"{'entry point':<12} {'module':<28} {'median ms':>10} {'min ms':>8}")
+    for name, module in ENTRY_POINTS.items():
+        timings = measure(module, args.repeat)
+        print(f"{name:<12} {module:<28} {statistics.median(timings) * 1000:>10.1f} {min(timings) * 1000:>8.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -1,34 +1,22 @@
 """Initialize the TimescaleDB database with required extensions and tables."""
+from datetime import timedelta
 from sqlalchemy import create_engine, text
-from sqlalchemy.orm import sessionmaker
+from src.config import get_settings
+from src.db.lifecycle import DataLifecycleManager, ParquetArchive
 from src.db.models import Base
-import os
 import psycopg2
-from dotenv import load_dotenv
-
-# Load environment variables
-load_dotenv()
-
-# Database connection parameters with default values
-DB_USER = os.getenv("DB_USER", "admin")
-DB_PASSWORD = os.getenv("DB_PASSWORD", "admin123")
-DB_HOST = os.getenv("DB_HOST", "localhost")
-DB_PORT = os.getenv("DB_PORT", "5433")
-DB_NAME = os.getenv("DB_NAME", "kpi_monitor")
-
-# Create database URL
-DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
 def init_db():
     """Initialize the database with TimescaleDB extension and tables."""
+    settings = get_settings()
     try:
         # First connect with psycopg2 to create extension
         conn = psycopg2.connect(
-            dbname=DB_NAME,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            host=DB_HOST,
-            port=DB_PORT
+            dbname=settings.db_name,
+            user=settings.db_user,
+            password=settings.db_password,
+            host=settings.db_host,
+            port=settings.db_port
         )
         conn.autocommit = True
         
@@ -40,8 +28,7 @@ def init_db():
         conn.close()
         
         # Then use SQLAlchemy to create tables
-        DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-        engine = create_engine(DATABASE_URL)
+        engine = create_engine(settings.database_url)
         
         # Create all tables
         Base.metadata.create_all(bind=engine)
@@ -56,9 +43,21 @@ def init_db():
                 SELECT create_hypertable('kpi_values', 'time',
                     if_not_exists => TRUE);
             """))
+            connection.execute(text("""
+                SELECT create_hypertable('sensor_sketches', 'bucket_start',
+                    if_not_exists => TRUE);
+            """))
             connection.commit()
             print("Hypertables created successfully!")
             
+        # Compress older chunks, segmented by sensor
+        DataLifecycleManager(
+            engine,
+            ParquetArchive(settings.archive_dir),
+            compress_after=timedelta(days=settings.compress_after_days)
+        ).configure_compression()
+        print("Compression policy configured successfully!")
+            
     except Exception as e:
         print(f"Error initializing database: {str(e)}")
         raise
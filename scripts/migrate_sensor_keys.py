@@ -0,0 +1,54 @@
+"""Migrate sensor_readings from text sensor ids to integer sensor keys."""
+from sqlalchemy import create_engine, text
+from src.config import get_settings
+from src.db.models import Sensor
+
+MIGRATION_STEPS = [
+    # Fill the dimension table with every sensor seen so far (latest unit wins)
+    """
+    INSERT INTO sensors (name, unit)
+    SELECT DISTINCT ON (sensor_id) sensor_id, unit
+    FROM sensor_readings
+    ORDER BY sensor_id, time DESC
+    ON CONFLICT (name) DO NOTHING;
+    """,
+    "ALTER TABLE sensor_readings ADD COLUMN IF NOT EXISTS sensor_key INTEGER;",
+    """
+    UPDATE sensor_readings r
+    SET sensor_key = s.id
+    FROM sensors s
+    WHERE s.name = r.sensor_id AND r.sensor_key IS NULL;
+    """,
+    "ALTER TABLE sensor_readings DROP CONSTRAINT IF EXISTS sensor_readings_pkey;",
+    "ALTER TABLE sensor_readings ALTER COLUMN sensor_key SET NOT NULL;",
+    "ALTER TABLE sensor_readings DROP COLUMN sensor_id, DROP COLUMN unit;",
+    "ALTER TABLE sensor_readings ADD PRIMARY KEY (time, sensor_key);",
+    """
+    ALTER TABLE sensor_readings
+    ADD CONSTRAINT sensor_readings_sensor_key_fkey
+    FOREIGN KEY (sensor_key) REFERENCES sensors (id);
+    """,
+]
+
+def migrate():
+    """Create the sensors table and rewrite readings to reference it."""
+    try:
+        engine = create_engine(get_settings().database_url)
+        Sensor.__table__.create(bind=engine, checkfirst=True)
+        
+        # A single transaction: either every step applies or none does
+        with engine.begin() as connection:
+            for step in MIGRATION_STEPS:
+                connection.execute(text(step))
+        print("sensor_readings migrated to integer sensor keys!")
+        
+        # Reclaim the space of the dropped text columns
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            connection.execute(text("VACUUM ANALYZE sensor_readings;"))
+            
+    except Exception as e:
+        print(f"Error migrating sensor keys: {str(e)}")
+        raise
+
+if __name__ == "__main__":
+    migrate()
@@ -11,8 +11,12 @@ def test_kpis():
     print("\nCalculando KPIs para los últimos 5 minutos...")
     print(f"Periodo: {start_time} a {end_time}")
     
-    oee = engine.calculate_oee(start_time, end_time)
-    print(f"\nOEE calculado: {oee:.2%}")
+    try:
+        oee = engine.calculate_oee(start_time, end_time)
+        print(f"\nOEE calculado: {oee:.2%}")
+    finally:
+        # Entrega las notificaciones de alertas antes de salir
+        engine.close()
     
 if __name__ == "__main__":
     test_kpis()
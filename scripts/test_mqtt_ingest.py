@@ -5,6 +5,9 @@ from datetime import datetime
 import os
 from dotenv import load_dotenv
 from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+from src.db.sensor_registry import SensorRegistry
 
 # Cargar variables de entorno
 load_dotenv()
@@ -20,6 +23,9 @@ DB_NAME = os.getenv("DB_NAME", "kpi_monitor")
 DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 engine = create_engine(DATABASE_URL)
 
+# Claves enteras de sensores, resueltas una vez por proceso
+sensors = SensorRegistry()
+
 def on_connect(client, userdata, flags, rc):
     """Callback cuando el cliente se conecta al broker."""
     if rc == 0:
@@ -35,16 +41,16 @@ def on_message(client, userdata, msg):
         print(f"Recibido: {payload}")
         
         # Insertar en la base de datos
-        with engine.connect() as conn:
-            conn.execute(text("""
-                INSERT INTO sensor_readings (time, sensor_id, value, unit)
-                VALUES (NOW(), :sensor_id, :value, :unit)
+        with Session(engine) as db:
+            sensor_key = sensors.get_or_create(db, payload.get("sensor_id"), payload.get("unit"))
+            db.execute(text("""
+                INSERT INTO sensor_readings (time, sensor_key, value)
+                VALUES (NOW(), :sensor_key, :value)
             """), {
-                "sensor_id": payload.get("sensor_id"),
-                "value": payload.get("value"),
-                "unit": payload.get("unit")
+                "sensor_key": sensor_key,
+                "value": payload.get("value")
             })
-            conn.commit()
+            db.commit()
             
         print(f"Guardado en BD: {payload}")
         
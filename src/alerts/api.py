@@ -1,4 +1,6 @@
 """FastAPI service for handling alerts."""
+from contextlib import asynccontextmanager
+from functools import lru_cache
 from fastapi import FastAPI, HTTPException, Depends
 from sqlalchemy.orm import Session
 from sqlalchemy import text, update
@@ -6,10 +8,31 @@ from typing import List
 from pydantic import BaseModel, ConfigDict
 from datetime import datetime, UTC
 
+from ..config import configure_logging, get_settings
 from ..db.database import SessionLocal
 from ..db.models import Alert, KPIValue
+from ..processing.rules import RuleStore, ThresholdRule
+from .notifications import AlertEvent, NotificationDispatcher, build_dispatcher, classify_alert
 
-app = FastAPI(title="KPI Monitor Alert Service")
+@lru_cache(maxsize=None)
+def get_notifier() -> NotificationDispatcher:
+    """Build the notification dispatcher from settings on first use."""
+    return build_dispatcher(get_settings())
+
+@lru_cache(maxsize=None)
+def get_rule_store() -> RuleStore:
+    """Open the KPI rule store configured in settings on first use."""
+    return RuleStore(get_settings().rules_path)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Configure logging when the service starts, not at import."""
+    configure_logging()
+    yield
+    if get_notifier.cache_info().currsize:
+        get_notifier().stop()
+
+app = FastAPI(title="KPI Monitor Alert Service", lifespan=lifespan)
 
 class AlertCreate(BaseModel):
     kpi_name: str
@@ -34,8 +57,10 @@ def get_db():
         db.close()
 
 @app.post("/alerts/", response_model=AlertResponse)
-async def create_alert(alert: AlertCreate, db: Session = Depends(get_db)):
+async def create_alert(alert: AlertCreate, db: Session = Depends(get_db),
+                       notifier: NotificationDispatcher = Depends(get_notifier)):
     """Create a new alert."""
+    kind = classify_alert(db, alert.kpi_name, alert.severity)
     db_alert = Alert(
         kpi_name=alert.kpi_name,
         severity=alert.severity,
@@ -46,6 +71,8 @@ async def create_alert(alert: AlertCreate, db: Session = Depends(get_db)):
     db.add(db_alert)
     db.commit()
     db.refresh(db_alert)
+    notifier.publish(AlertEvent(kind, db_alert.kpi_name, db_alert.severity, db_alert.message,
+                                db_alert.time, db_alert.id))
     return db_alert
 
 @app.get("/alerts/", response_model=List[AlertResponse])
@@ -73,6 +100,25 @@ async def acknowledge_alert(alert_id: int, db: Session = Depends(get_db)):
         db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/rules/", response_model=List[ThresholdRule])
+async def get_rules(store: RuleStore = Depends(get_rule_store)):
+    """Get the active KPI threshold and alert rules."""
+    return store.rules
+
+@app.put("/rules/", response_model=List[ThresholdRule])
+async def replace_rules(rules: List[ThresholdRule], store: RuleStore = Depends(get_rule_store)):
+    """Replace all rules; KPI workers pick them up on their next cycle."""
+    try:
+        store.replace(rules)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return store.rules
+
+@app.post("/rules/reload")
+async def reload_rules(store: RuleStore = Depends(get_rule_store)):
+    """Reload the rules from their file after an external edit."""
+    return {"message": "Rules reloaded", "count": store.reload()}
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
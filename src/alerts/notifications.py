@@ -0,0 +1,343 @@
+"""Asynchronous alert notification dispatcher."""
+import asyncio
+import json
+import threading
+from abc import ABC, abstractmethod
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, UTC
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence
+
+from loguru import logger
+from sqlalchemy.orm import Session
+
+from ..config import Settings
+from ..db.models import Alert
+
+if TYPE_CHECKING:
+    from email.message import EmailMessage
+
+
+@dataclass(frozen=True)
+class AlertEvent:
+    """Alert lifecycle event delivered to notification sinks."""
+    kind: str  # 'created', 'escalated'
+    kpi_name: str
+    severity: str
+    message: str
+    time: datetime = field(default_factory=lambda: datetime.now(UTC))
+    alert_id: Optional[int] = None
+
+    def to_dict(self) -> dict:
+        data = asdict(self)
+        data["time"] = self.time.isoformat()
+        return data
+
+
+def classify_alert(db: Session, kpi_name: str, severity: str) -> str:
+    """Return 'escalated' if a new critical alert follows an open warning, else 'created'."""
+    if severity != "critical":
+        return "created"
+    previous = db.query(Alert).filter(
+        Alert.kpi_name == kpi_name,
+        Alert.acknowledged == 0
+    ).order_by(Alert.time.desc()).first()
+    return "escalated" if previous is not None and previous.severity == "warning" else "created"
+
+
+def format_digest(events: Sequence[AlertEvent], max_lines: int = 20) -> str:
+    """Render a burst of events as one human-readable digest."""
+    by_severity: Dict[str, int] = {}
+    for event in events:
+        by_severity[event.severity] = by_severity.get(event.severity, 0) + 1
+    summary = ", ".join(f"{count} {severity}" for severity, count in sorted(by_severity.items()))
+    lines = [f"{len(events)} alertas ({summary})"]
+    lines += [f"[{e.severity}] {e.kind} {e.kpi_name}: {e.message}" for e in events[:max_lines]]
+    if len(events) > max_lines:
+        lines.append(f"... y {len(events) - max_lines} más")
+    return "\n".join(lines)
+
+
+class NotificationSink(ABC):
+    """Delivery channel; ``destination`` groups events for coalescing and rate limits."""
+    destination = "sink"
+
+    @abstractmethod
+    async def send(self, events: List[AlertEvent]):
+        """Deliver one digest; raising marks the attempt as failed and retries it."""
+
+
+class WebhookSink(NotificationSink):
+    """POSTs a JSON digest to an HTTP endpoint."""
+
+    def __init__(self, url: str, timeout: float = 10.0):
+        self.url = url
+        self.timeout = timeout
+        self.destination = f"webhook:{url}"
+
+    async def send(self, events: List[AlertEvent]):
+        body = json.dumps({
+            "summary": format_digest(events),
+            "events": [event.to_dict() for event in events],
+        }).encode()
+        await asyncio.to_thread(self._post, body)
+
+    def _post(self, body: bytes):
+        import urllib.request
+
+        request = urllib.request.Request(
+            self.url, data=body, headers={"Content-Type": "application/json"}, method="POST"
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+
+class SMTPSink(NotificationSink):
+    """Emails a plain-text digest."""
+
+    def __init__(self, host: str, port: int, sender: str, recipients: Sequence[str], timeout: float = 10.0):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.recipients = list(recipients)
+        self.timeout = timeout
+        self.destination = f"smtp:{','.join(self.recipients)}"
+
+    async def send(self, events: List[AlertEvent]):
+        from email.message import EmailMessage
+
+        message = EmailMessage()
+        worst = "critical" if any(e.severity == "critical" for e in events) else events[0].severity
+        message["Subject"] = f"[KPI Monitor] {len(events)} alertas ({worst})"
+        message["From"] = self.sender
+        message["To"] = ", ".join(self.recipients)
+        message.set_content(format_digest(events, max_lines=200))
+        await asyncio.to_thread(self._send, message)
+
+    def _send(self, message: "EmailMessage"):
+        import smtplib
+
+        with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+            smtp.send_message(message)
+
+
+class FileSink(NotificationSink):
+    """Appends one JSON line per digest; meant for tests and local runs."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.destination = f"file:{path}"
+
+    async def send(self, events: List[AlertEvent]):
+        line = json.dumps({"count": len(events), "events": [event.to_dict() for event in events]})
+        await asyncio.to_thread(self._append, line)
+
+    def _append(self, line: str):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+# Time allowed on shutdown for the sends themselves, on top of the retry backoff
+STOP_GRACE_SECONDS = 30.0
+
+
+class NotificationDispatcher:
+    """Coalesces alert events per destination and delivers them off-thread.
+
+    ``publish`` is non-blocking and safe to call from any thread: events are
+    handed to an asyncio loop running in a background thread. Events for the
+    same destination arriving within ``coalesce_seconds`` are merged into one
+    digest, each destination sends at most once per ``min_interval`` seconds,
+    and failed sends are retried with exponential backoff.
+
+    Events stay pending per destination until its rate limit allows the next
+    send, so at most one digest per destination is queued or in flight and
+    everything that arrives meanwhile is merged into the following one.
+    """
+
+    def __init__(
+        self,
+        sinks: Sequence[NotificationSink],
+        workers: int = 4,
+        coalesce_seconds: float = 5.0,
+        min_interval: float = 30.0,
+        max_retries: int = 5,
+        backoff_base: float = 1.0,
+        backoff_max: float = 300.0,
+        max_pending: int = 10_000,
+    ):
+        self.sinks = list(sinks)
+        self.workers = workers
+        self.coalesce_seconds = coalesce_seconds
+        self.min_interval = min_interval
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_pending = max_pending
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._lock = threading.Lock()
+        self._pending: Dict[str, List[AlertEvent]] = {}
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        self._next_send: Dict[str, float] = {}
+        self._in_flight: Dict[str, int] = {}  # destination -> events being sent
+        self.dropped = 0
+        self.failed = 0
+
+    def start(self):
+        """Start the background event loop and worker pool (idempotent)."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            ready = threading.Event()
+            self._thread = threading.Thread(target=self._run, args=(ready,), name="alert-notifier", daemon=True)
+            self._thread.start()
+            ready.wait()
+
+    def publish(self, event: AlertEvent):
+        """Queue an event for delivery without blocking the caller."""
+        if not self.sinks:
+            return
+        self.start()
+        self._loop.call_soon_threadsafe(self._enqueue, event)
+
+    def stop(self, timeout: Optional[float] = None):
+        """Flush pending digests, wait for in-flight sends and stop the loop.
+
+        The default ``timeout`` covers the full retry schedule plus
+        ``STOP_GRACE_SECONDS``. Events still pending or in flight when it
+        expires are counted in ``failed`` and logged as given up.
+        """
+        if self._thread is None:
+            return
+        if timeout is None:
+            timeout = self.retry_seconds() + STOP_GRACE_SECONDS
+        future = asyncio.run_coroutine_threadsafe(self._drain(), self._loop)
+        try:
+            future.result(timeout)
+        except Exception as e:
+            logger.error(f"Error flushing alert notifications: {str(e)}")
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout)
+        self._thread = None
+
+        # Digests interrupted mid-send are counted by their worker
+        lost = sum(len(events) for events in self._pending.values()) + sum(self._in_flight.values())
+        if lost:
+            self.failed += lost
+            logger.error(f"Giving up on {lost} alert notifications still pending at shutdown")
+        self._pending.clear()
+        self._in_flight.clear()
+        self._timers.clear()
+
+    def retry_seconds(self) -> float:
+        """Total backoff delay of one digest that fails every attempt."""
+        return sum(min(self.backoff_base * 2 ** attempt, self.backoff_max) for attempt in range(self.max_retries))
+
+    def _run(self, ready: threading.Event):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._queue = asyncio.Queue()
+        self._tasks = [self._loop.create_task(self._worker()) for _ in range(self.workers)]
+        ready.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            for task in self._tasks:
+                task.cancel()
+            self._loop.run_until_complete(asyncio.gather(*self._tasks, return_exceptions=True))
+            self._loop.close()
+
+    def _enqueue(self, event: AlertEvent):
+        for sink in self.sinks:
+            pending = self._pending.setdefault(sink.destination, [])
+            if len(pending) >= self.max_pending:
+                self.dropped += 1
+                continue
+            pending.append(event)
+            self._schedule(sink, self.coalesce_seconds)
+
+    def _schedule(self, sink: NotificationSink, delay: float):
+        """Arm the flush timer unless one is armed or a digest is in flight."""
+        if sink.destination in self._timers or sink.destination in self._in_flight:
+            return
+        wait = self._next_send.get(sink.destination, 0.0) - self._loop.time()
+        self._timers[sink.destination] = self._loop.call_later(max(delay, wait), self._flush, sink)
+
+    def _flush(self, sink: NotificationSink):
+        self._timers.pop(sink.destination, None)
+        events = self._pending.pop(sink.destination, [])
+        if events:
+            self._in_flight[sink.destination] = len(events)
+            self._next_send[sink.destination] = self._loop.time() + self.min_interval
+            self._queue.put_nowait((sink, events))
+
+    async def _drain(self):
+        # Flush everything pending regardless of rate limits, until nothing is left
+        while True:
+            for sink in self.sinks:
+                if sink.destination in self._in_flight:
+                    continue
+                timer = self._timers.get(sink.destination)
+                if timer is not None:
+                    timer.cancel()
+                self._flush(sink)
+            await self._queue.join()
+            if not any(self._pending.get(sink.destination) for sink in self.sinks):
+                return
+
+    async def _worker(self):
+        while True:
+            sink, events = await self._queue.get()
+            try:
+                await self._deliver(sink, events)
+            except asyncio.CancelledError:
+                # stop() timed out while this digest was being sent or retried
+                self.failed += len(events)
+                logger.error(f"Giving up on {len(events)} alert notifications to {sink.destination} at shutdown")
+                raise
+            finally:
+                # Events that arrived during the send go out once the rate limit allows
+                self._in_flight.pop(sink.destination, None)
+                if self._pending.get(sink.destination):
+                    self._schedule(sink, 0.0)
+                self._queue.task_done()
+
+    async def _deliver(self, sink: NotificationSink, events: List[AlertEvent]):
+        for attempt in range(self.max_retries + 1):
+            try:
+                await sink.send(events)
+                logger.info(f"Sent {len(events)} alert notifications to {sink.destination}")
+                return
+            except Exception as e:
+                if attempt == self.max_retries:
+                    break
+                delay = min(self.backoff_base * 2 ** attempt, self.backoff_max)
+                logger.warning(f"Notification to {sink.destination} failed ({str(e)}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+        self.failed += len(events)
+        logger.error(f"Giving up on {len(events)} alert notifications to {sink.destination}")
+
+
+def build_dispatcher(settings: Settings) -> NotificationDispatcher:
+    """Create a dispatcher with the sinks configured in ``settings``."""
+    sinks: List[NotificationSink] = []
+    if settings.notify_webhook_url:
+        sinks.append(WebhookSink(settings.notify_webhook_url))
+    if settings.notify_smtp_host and settings.notify_email_to:
+        sinks.append(SMTPSink(
+            settings.notify_smtp_host,
+            settings.notify_smtp_port,
+            settings.notify_email_from,
+            [address.strip() for address in settings.notify_email_to.split(",") if address.strip()],
+        ))
+    if settings.notify_file_path:
+        sinks.append(FileSink(settings.notify_file_path))
+    return NotificationDispatcher(
+        sinks,
+        coalesce_seconds=settings.notify_coalesce_seconds,
+        min_interval=settings.notify_min_interval,
+    )
@@ -0,0 +1,81 @@
+"""Application settings loaded lazily from the environment."""
+import dataclasses
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional
+
+from loguru import logger
+
+
+@dataclass(frozen=True)
+class Settings:
+    """Typed configuration; each field is read from the upper-cased env var."""
+    db_user: str = "admin"
+    db_password: str = "admin123"
+    db_host: str = "localhost"
+    db_port: int = 5433
+    db_name: str = "kpi_monitor"
+
+    mqtt_broker: str = "localhost"
+    mqtt_port: int = 1883
+    mqtt_topic: str = "plant/sensors/#"
+
+    log_level: str = "INFO"
+    log_file: str = "logs/kpi_monitor.log"
+
+    anomaly_checkpoint_path: str = "data/anomaly_detector.npz"
+
+    late_reading_seconds: float = 120.0  # readings may still arrive this long after their timestamp
+
+    rules_path: str = "config/kpi_rules.json"
+    plant_timezone: str = "UTC"  # local time used by shift-scoped rules
+
+    archive_dir: str = "data/archive"
+    retention_days: int = 90
+    compress_after_days: int = 7
+
+    notify_webhook_url: str = ""
+    notify_smtp_host: str = ""
+    notify_smtp_port: int = 25
+    notify_email_from: str = "kpi-monitor@localhost"
+    notify_email_to: str = ""  # comma-separated
+    notify_file_path: str = ""
+    notify_coalesce_seconds: float = 5.0
+    notify_min_interval: float = 30.0
+
+    @property
+    def database_url(self) -> str:
+        return f"postgresql://{self.db_user}:{self.db_password}@{self.db_host}:{self.db_port}/{self.db_name}"
+
+    @classmethod
+    def from_env(cls, env_file: Optional[str] = ".env") -> "Settings":
+        """Build settings from environment variables and an optional .env file."""
+        if env_file:
+            from dotenv import load_dotenv
+            load_dotenv(env_file)
+
+        values = {}
+        for field in dataclasses.fields(cls):
+            raw = os.getenv(field.name.upper())
+            if raw is not None:
+                values[field.name] = field.type(raw)
+        return cls(**values)
+
+
+@lru_cache(maxsize=None)
+def get_settings() -> Settings:
+    """Return the process-wide settings, reading the environment on first use."""
+    return Settings.from_env()
+
+
+_log_sink_id: Optional[int] = None
+
+
+def configure_logging(settings: Optional[Settings] = None):
+    """Add the file log sink once; called by entry points, not at import."""
+    global _log_sink_id
+    if _log_sink_id is not None:
+        return
+    settings = settings or get_settings()
+    _log_sink_id = logger.add(settings.log_file, rotation="500 MB", level=settings.log_level)
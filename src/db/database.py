@@ -1,28 +1,31 @@
 """Database connection and models."""
+from functools import lru_cache
+
 from sqlalchemy import create_engine
-from sqlalchemy.orm import declarative_base, sessionmaker
-import os
-from dotenv import load_dotenv
-
-# Load environment variables
-load_dotenv()
-
-# Database connection parameters
-DB_USER = os.getenv("DB_USER", "admin")
-DB_PASSWORD = os.getenv("DB_PASSWORD", "admin123")
-DB_HOST = os.getenv("DB_HOST", "localhost")
-DB_PORT = os.getenv("DB_PORT", "5433")
-DB_NAME = os.getenv("DB_NAME", "kpi_monitor")
-
-# Create database URL
-DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-
-# Create SQLAlchemy engine
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={'client_encoding': 'utf8'}
-)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, declarative_base, sessionmaker
+
+from ..config import get_settings
 
 # Create base class for SQLAlchemy models
 Base = declarative_base()
+
+
+@lru_cache(maxsize=None)
+def get_engine() -> Engine:
+    """Create the SQLAlchemy engine on first use."""
+    return create_engine(
+        get_settings().database_url,
+        connect_args={'client_encoding': 'utf8'}
+    )
+
+
+@lru_cache(maxsize=None)
+def get_sessionmaker() -> sessionmaker:
+    """Create the session factory bound to the default engine on first use."""
+    return sessionmaker(autocommit=False, autoflush=False, bind=get_engine())
+
+
+def SessionLocal() -> Session:
+    """Open a new session on the default engine."""
+    return get_sessionmaker()()
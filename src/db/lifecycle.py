@@ -0,0 +1,216 @@
+"""Tiered retention: TimescaleDB compression and a Parquet cold archive."""
+import os
+from datetime import date, datetime, timedelta, timezone
+from typing import TYPE_CHECKING, Iterable, Iterator, Optional
+
+from loguru import logger
+from sqlalchemy import delete, func, select, text
+from sqlalchemy.engine import Engine
+
+from ..config import Settings, configure_logging, get_settings
+from ..utils.timeutils import as_utc
+from .models import Sensor, SensorReading
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+ARCHIVE_TABLE = "sensor_readings"
+ARCHIVE_COLUMNS = ["time", "sensor_key", "sensor_id", "value"]
+
+
+class ParquetArchive:
+    """Date-partitioned Parquet files holding readings past the retention horizon.
+
+    Layout: ``<root>/sensor_readings/date=YYYY-MM-DD/readings.parquet``. The
+    ``_watermark`` file records the instant before which every reading lives
+    in the archive; readings at or after it are still in the database.
+    """
+
+    def __init__(self, root: str):
+        self.root = os.path.join(root, ARCHIVE_TABLE)
+        self._watermark_cache = (None, None)  # (mtime, watermark)
+
+    def watermark(self) -> Optional[datetime]:
+        """Return the archive watermark (aware UTC), or None if nothing is archived."""
+        try:
+            mtime = os.stat(self._watermark_path()).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        # Re-read only when another process (the lifecycle job) moved it
+        if self._watermark_cache[0] != mtime:
+            with open(self._watermark_path(), encoding="utf-8") as f:
+                self._watermark_cache = (mtime, datetime.fromisoformat(f.read().strip()))
+        return self._watermark_cache[1]
+
+    def set_watermark(self, timestamp: datetime):
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = f"{self._watermark_path()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(as_utc(timestamp).isoformat())
+        os.replace(tmp_path, self._watermark_path())
+
+    def write_day(self, day: date, readings: "pd.DataFrame"):
+        """Atomically write one day of readings."""
+        directory = os.path.join(self.root, f"date={day.isoformat()}")
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, "readings.parquet")
+        readings[ARCHIVE_COLUMNS].to_parquet(f"{path}.tmp", index=False)
+        os.replace(f"{path}.tmp", path)
+
+    def iter_days(self, lower: datetime, upper: datetime, include_upper: bool = True,
+                  sensor_keys: Optional[Iterable[int]] = None) -> Iterator["pd.DataFrame"]:
+        """Yield archived readings in the range one day at a time, ordered by time.
+
+        Frames have columns ``time`` (aware UTC), ``sensor_key`` and ``value``.
+        """
+        import pandas as pd
+
+        lower, upper = as_utc(lower), as_utc(upper)
+        filters = [("sensor_key", "in", list(sensor_keys))] if sensor_keys is not None else None
+        day = lower.date()
+        while day <= upper.date():
+            path = os.path.join(self.root, f"date={day.isoformat()}", "readings.parquet")
+            day += timedelta(days=1)
+            if not os.path.exists(path):
+                continue
+            readings = pd.read_parquet(path, columns=["time", "sensor_key", "value"], filters=filters)
+            in_range = (readings["time"] >= lower) & (
+                readings["time"] <= upper if include_upper else readings["time"] < upper)
+            readings = readings[in_range]
+            if not readings.empty:
+                yield readings.sort_values("time", kind="stable").reset_index(drop=True)
+
+    def read(self, lower: datetime, upper: datetime, include_upper: bool = True,
+             sensor_keys: Optional[Iterable[int]] = None) -> "pd.DataFrame":
+        """Read archived readings in the range as a single frame."""
+        import pandas as pd
+
+        if sensor_keys is not None:
+            sensor_keys = list(sensor_keys)
+        frames = list(self.iter_days(lower, upper, include_upper, sensor_keys))
+        if not frames:
+            return pd.DataFrame({
+                "time": pd.Series(dtype="datetime64[us, UTC]"),
+                "sensor_key": pd.Series(dtype="int64"),
+                "value": pd.Series(dtype="float64"),
+            })
+        return pd.concat(frames, ignore_index=True)
+
+    def _watermark_path(self) -> str:
+        return os.path.join(self.root, "_watermark")
+
+
+class DataLifecycleManager:
+    """Compresses warm chunks and moves readings past retention to Parquet."""
+
+    def __init__(self, engine: Engine, archive: ParquetArchive,
+                 retention: timedelta = timedelta(days=90),
+                 compress_after: timedelta = timedelta(days=7)):
+        self.engine = engine
+        self.archive = archive
+        self.retention = retention
+        self.compress_after = compress_after
+
+    @property
+    def is_timescale(self) -> bool:
+        return self.engine.dialect.name == "postgresql"
+
+    def configure_compression(self):
+        """Enable native compression segmented by sensor, with a background policy."""
+        if not self.is_timescale:
+            logger.info("Compression requires TimescaleDB, skipping")
+            return
+        with self.engine.begin() as connection:
+            enabled = connection.execute(
+                text("SELECT compression_enabled FROM timescaledb_information.hypertables "
+                     "WHERE hypertable_name = :table;"),
+                {"table": ARCHIVE_TABLE}
+            ).scalar()
+            # Changing compression settings fails once chunks are compressed, so only set them once
+            if not enabled:
+                connection.execute(text(f"""
+                    ALTER TABLE {ARCHIVE_TABLE} SET (
+                        timescaledb.compress,
+                        timescaledb.compress_segmentby = 'sensor_key',
+                        timescaledb.compress_orderby = 'time DESC'
+                    );
+                """))
+            connection.execute(
+                text(f"SELECT add_compression_policy('{ARCHIVE_TABLE}', CAST(:after AS INTERVAL), if_not_exists => TRUE);"),
+                {"after": f"{int(self.compress_after.total_seconds())} seconds"}
+            )
+        logger.info(f"Compression enabled on {ARCHIVE_TABLE} for chunks older than {self.compress_after}")
+
+    def run(self, now: Optional[datetime] = None) -> int:
+        """Archive whole days past the retention horizon, then drop them from the database.
+
+        Returns the number of days archived. The watermark advances after each
+        day is written, so an interrupted run resumes where it stopped.
+        """
+        import pandas as pd
+
+        now = as_utc(now or datetime.now(timezone.utc))
+        horizon = datetime.combine((now - self.retention).date(), datetime.min.time(), tzinfo=timezone.utc)
+
+        day_start = self.archive.watermark()
+        if day_start is None:
+            with self.engine.connect() as connection:
+                oldest = connection.execute(select(func.min(SensorReading.time))).scalar()
+            if oldest is None:
+                return 0
+            day_start = datetime.combine(as_utc(oldest).date(), datetime.min.time(), tzinfo=timezone.utc)
+
+        archived = 0
+        while day_start < horizon:
+            day_end = day_start + timedelta(days=1)
+            query = select(
+                SensorReading.time, SensorReading.sensor_key, Sensor.name.label("sensor_id"), SensorReading.value
+            ).join(Sensor, Sensor.id == SensorReading.sensor_key).where(
+                SensorReading.time >= day_start, SensorReading.time < day_end
+            ).order_by(SensorReading.time)
+            with self.engine.connect() as connection:
+                readings = pd.read_sql(query, connection)
+            if not readings.empty:
+                readings["time"] = pd.to_datetime(readings["time"], utc=True)
+                self.archive.write_day(day_start.date(), readings)
+                logger.info(f"Archived {len(readings)} readings of {day_start.date()}")
+            self.archive.set_watermark(day_end)
+            day_start = day_end
+            archived += 1
+
+        # Also completes a drop interrupted after the watermark had advanced
+        watermark = self.archive.watermark()
+        if watermark is not None:
+            self._drop_archived(watermark)
+        return archived
+
+    def _drop_archived(self, watermark: datetime):
+        """Remove readings that are now served from the archive."""
+        with self.engine.begin() as connection:
+            if self.is_timescale:
+                # Whole chunks only; rows left behind are still read from the database
+                connection.execute(
+                    text(f"SELECT drop_chunks('{ARCHIVE_TABLE}', older_than => CAST(:watermark AS TIMESTAMPTZ));"),
+                    {"watermark": watermark}
+                )
+            else:
+                connection.execute(delete(SensorReading).where(SensorReading.time < watermark))
+        logger.info(f"Dropped readings older than {watermark} from {ARCHIVE_TABLE}")
+
+
+def build_lifecycle_manager(settings: Settings) -> DataLifecycleManager:
+    """Create a lifecycle manager from ``settings``."""
+    from .database import get_engine
+
+    return DataLifecycleManager(
+        get_engine(),
+        ParquetArchive(settings.archive_dir),
+        retention=timedelta(days=settings.retention_days),
+        compress_after=timedelta(days=settings.compress_after_days),
+    )
+
+
+if __name__ == "__main__":
+    configure_logging()
+    # Compression is configured once by scripts/init_db.py; periodic runs only archive
+    build_lifecycle_manager(get_settings()).run()
@@ -1,16 +1,32 @@
 """Database models for the KPI monitor."""
-from sqlalchemy import Column, Integer, Float, String, TIMESTAMP, text
+from sqlalchemy import Column, ForeignKey, Integer, Float, String, Text, TIMESTAMP, text
 from datetime import datetime
 
 from .database import Base
 
+class Sensor(Base):
+    __tablename__ = "sensors"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    name = Column(String, nullable=False, unique=True)  # external sensor id, e.g. 'STATUS001'
+    unit = Column(String, nullable=False)
+    machine = Column(String, nullable=True)
+
 class SensorReading(Base):
     __tablename__ = "sensor_readings"
 
     time = Column(TIMESTAMP(timezone=True), primary_key=True, nullable=False, server_default=text('CURRENT_TIMESTAMP'))
-    sensor_id = Column(String, primary_key=True, nullable=False)
+    sensor_key = Column(Integer, ForeignKey("sensors.id"), primary_key=True, nullable=False)
     value = Column(Float, nullable=False)
-    unit = Column(String, nullable=False)
+
+class SensorSketch(Base):
+    __tablename__ = "sensor_sketches"
+
+    bucket_start = Column(TIMESTAMP(timezone=True), primary_key=True, nullable=False)
+    sensor_key = Column(Integer, ForeignKey("sensors.id"), primary_key=True, nullable=False)
+    bucket_seconds = Column(Integer, primary_key=True, nullable=False)
+    count = Column(Integer, nullable=False)
+    sketch = Column(Text, nullable=False)  # DDSketch serialized as JSON
     
 class KPIValue(Base):
     __tablename__ = "kpi_values"
@@ -0,0 +1,114 @@
+"""In-memory interning cache between external sensor ids and integer keys."""
+from typing import Dict, Iterable, NamedTuple, Optional
+
+from loguru import logger
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from .models import Sensor
+
+# Session.info key holding sensors created in the session's open transaction
+_PENDING_INFO_KEY = "sensor_registry.pending"
+
+
+class SensorInfo(NamedTuple):
+    """Cached row of the ``sensors`` dimension table."""
+    key: int
+    name: str
+    unit: str
+    machine: Optional[str]
+
+
+class SensorRegistry:
+    """Maps external sensor ids to the integer keys stored in readings.
+
+    Sensors are looked up in the database once and then served from memory;
+    the mapping never changes after a sensor is created, so entries do not
+    need to be invalidated. Sensors registered by ``get_or_create`` are only
+    cached once the caller's transaction commits, so a rolled-back
+    registration is looked up (and created) again instead of serving a key
+    that does not exist.
+    """
+
+    def __init__(self):
+        self._by_name: Dict[str, SensorInfo] = {}
+        self._by_key: Dict[int, SensorInfo] = {}
+
+    def __len__(self) -> int:
+        return len(self._by_name)
+
+    def get_or_create(self, db: Session, name: str, unit: str, machine: Optional[str] = None) -> int:
+        """Return the key of a sensor, registering it on first sight."""
+        info = self._by_name.get(name) or self._pending(db).get(name)
+        if info is not None:
+            return info.key
+
+        sensor = db.query(Sensor).filter(Sensor.name == name).first()
+        if sensor is None:
+            try:
+                # Savepoint: another ingest process may register the same sensor
+                with db.begin_nested():
+                    sensor = Sensor(name=name, unit=unit, machine=machine)
+                    db.add(sensor)
+                logger.info(f"Registered sensor {name} ({unit})")
+                return self._remember_on_commit(db, sensor).key
+            except IntegrityError:
+                sensor = db.query(Sensor).filter(Sensor.name == name).one()
+        return self._remember(sensor).key
+
+    def key_for(self, db: Session, name: str) -> Optional[int]:
+        """Return the key of a known sensor, or None if it was never seen."""
+        return self.keys_for(db, [name]).get(name)
+
+    def keys_for(self, db: Session, names: Iterable[str]) -> Dict[str, int]:
+        """Resolve several external ids at once; unknown ids are omitted."""
+        names = set(names)
+        missing = [name for name in names if name not in self._by_name]
+        if missing:
+            for sensor in db.query(Sensor).filter(Sensor.name.in_(missing)):
+                self._remember(sensor)
+        return {name: self._by_name[name].key for name in names if name in self._by_name}
+
+    def info_for_keys(self, db: Session, keys: Iterable[int]) -> Dict[int, SensorInfo]:
+        """Resolve integer keys back to sensor names, units and machines."""
+        keys = {int(key) for key in keys}
+        missing = [key for key in keys if key not in self._by_key]
+        if missing:
+            for sensor in db.query(Sensor).filter(Sensor.id.in_(missing)):
+                self._remember(sensor)
+        return {key: self._by_key[key] for key in keys if key in self._by_key}
+
+    def _remember(self, sensor: Sensor) -> SensorInfo:
+        info = SensorInfo(sensor.id, sensor.name, sensor.unit, sensor.machine)
+        self._by_name[info.name] = info
+        self._by_key[info.key] = info
+        return info
+
+    def _pending(self, db: Session) -> Dict[str, SensorInfo]:
+        """Sensors this registry created in ``db``'s open transaction."""
+        return db.info.get((_PENDING_INFO_KEY, id(self)), {})
+
+    def _remember_on_commit(self, db: Session, sensor: Sensor) -> SensorInfo:
+        """Cache a sensor created in ``db`` once its outermost transaction commits."""
+        info = SensorInfo(sensor.id, sensor.name, sensor.unit, sensor.machine)
+        info_key = (_PENDING_INFO_KEY, id(self))
+        if info_key not in db.info:
+            db.info[info_key] = {}
+            event.listen(db, "after_commit", self._on_commit)
+            event.listen(db, "after_transaction_end", self._on_transaction_end)
+        db.info[info_key][info.name] = info
+        return info
+
+    def _on_commit(self, db: Session):
+        # after_commit also fires when a savepoint is released
+        if db.in_nested_transaction():
+            return
+        for info in self._pending(db).values():
+            self._by_name[info.name] = info
+            self._by_key[info.key] = info
+
+    def _on_transaction_end(self, db: Session, transaction):
+        # Committed sensors were cached by _on_commit; rolled-back ones are dropped
+        if transaction.parent is None:
+            self._pending(db).clear()
@@ -0,0 +1,251 @@
+"""Online per-sensor anomaly detection for the ingest path."""
+import os
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import numpy as np
+from loguru import logger
+
+# Units of on/off style sensors, where only dropouts are meaningful
+DISCRETE_UNITS = frozenset({"binary", "status"})
+
+# Bit flags kept per sensor in a single uint8 array
+_DISCRETE = 1
+_IN_SPIKE = 2
+_STUCK_ALERTED = 4
+_DROPPED = 8
+
+# Lower bound for the EWMA standard deviation, relative to the mean
+_STD_FLOOR = 1e-3
+
+_STATE_ARRAYS = ("mean", "var", "last_value", "last_seen", "count", "stuck", "flags")
+
+
+@dataclass(frozen=True)
+class Anomaly:
+    """Anomaly raised by the streaming detector."""
+    sensor_id: str
+    kind: str  # 'spike', 'stuck', 'dropout'
+    severity: str  # 'warning', 'critical'
+    message: str
+    timestamp: float
+
+
+class StreamingAnomalyDetector:
+    """Per-sensor EWMA, stuck-value and dropout detector with O(1) state.
+
+    State for every sensor lives in parallel NumPy arrays indexed by a slot
+    number, which keeps the footprint at a few dozen bytes per sensor. The
+    arrays are periodically written to ``checkpoint_path`` and reloaded on
+    start so detectors do not need to warm up again after a restart.
+    """
+
+    def __init__(
+        self,
+        alpha: float = 0.05,
+        z_threshold: float = 4.0,
+        warmup: int = 30,
+        stuck_limit: int = 30,
+        stuck_tolerance: float = 1e-9,
+        dropout_seconds: float = 300.0,
+        housekeeping_interval: float = 10.0,
+        checkpoint_path: Optional[str] = None,
+        checkpoint_interval: float = 60.0,
+        initial_capacity: int = 1024,
+    ):
+        self.alpha = alpha
+        self.z_threshold = z_threshold
+        self.warmup = warmup
+        self.stuck_limit = stuck_limit
+        self.stuck_tolerance = stuck_tolerance
+        self.dropout_seconds = dropout_seconds
+        self.housekeeping_interval = housekeeping_interval
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_interval = checkpoint_interval
+
+        self._index: Dict[str, int] = {}
+        self._names: List[str] = []
+        self._allocate(max(initial_capacity, 1))
+        self._last_housekeeping = 0.0
+        self._last_checkpoint = time.time()
+
+        if checkpoint_path and os.path.exists(checkpoint_path):
+            self.load_checkpoint(checkpoint_path)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def update(self, sensor_id: str, value: float, timestamp: float, unit: Optional[str] = None) -> List[Anomaly]:
+        """Feed one reading and return the anomalies it triggers.
+
+        Also runs the periodic dropout check and checkpoint, so the returned
+        list may contain dropouts of other sensors.
+        """
+        i = self._slot(sensor_id, unit)
+        value = float(value)
+        anomalies = []
+        flags = int(self._flags[i])
+        count = int(self._count[i])
+
+        if flags & _DROPPED:
+            flags &= ~_DROPPED
+            logger.info(f"Sensor {sensor_id} reporting again")
+
+        if not flags & _DISCRETE and count > 0:
+            mean = self._mean[i]
+            delta = value - mean
+
+            # Valor fuera de la banda EWMA
+            if count >= self.warmup:
+                std = max(np.sqrt(self._var[i]), _STD_FLOOR * abs(mean), 1e-9)
+                z = abs(delta) / std
+                if z > self.z_threshold:
+                    if not flags & _IN_SPIKE:
+                        flags |= _IN_SPIKE
+                        severity = "critical" if z > 2 * self.z_threshold else "warning"
+                        anomalies.append(Anomaly(
+                            sensor_id, "spike", severity,
+                            f"Sensor {sensor_id}: valor {value:g} fuera de rango (z={z:.1f}, media {mean:g})",
+                            timestamp,
+                        ))
+                else:
+                    flags &= ~_IN_SPIKE
+
+            self._mean[i] = mean + self.alpha * delta
+            self._var[i] = (1 - self.alpha) * (self._var[i] + self.alpha * delta * delta)
+
+            # Valor congelado
+            if abs(value - self._last_value[i]) <= self.stuck_tolerance:
+                self._stuck[i] += 1
+                if self._stuck[i] >= self.stuck_limit and not flags & _STUCK_ALERTED:
+                    flags |= _STUCK_ALERTED
+                    anomalies.append(Anomaly(
+                        sensor_id, "stuck", "warning",
+                        f"Sensor {sensor_id}: valor {value:g} sin cambios en {int(self._stuck[i])} lecturas",
+                        timestamp,
+                    ))
+            else:
+                self._stuck[i] = 0
+                flags &= ~_STUCK_ALERTED
+        elif count == 0:
+            self._mean[i] = value
+            self._var[i] = 0.0
+
+        self._count[i] = count + 1
+        self._last_value[i] = value
+        self._last_seen[i] = timestamp
+        self._flags[i] = flags
+
+        anomalies.extend(self._housekeeping(timestamp))
+        return anomalies
+
+    def check_dropouts(self, now: float) -> List[Anomaly]:
+        """Return a dropout anomaly for each sensor silent for too long."""
+        n = len(self._names)
+        silent = (
+            (now - self._last_seen[:n] > self.dropout_seconds)
+            & (self._count[:n] > 0)
+            & ((self._flags[:n] & _DROPPED) == 0)
+        )
+        slots = np.flatnonzero(silent)
+        self._flags[slots] |= _DROPPED
+        return [
+            Anomaly(
+                self._names[i], "dropout", "critical",
+                f"Sensor {self._names[i]}: sin lecturas desde hace {now - self._last_seen[i]:.0f} s",
+                now,
+            )
+            for i in slots
+        ]
+
+    def tick(self, now: float) -> List[Anomaly]:
+        """Run the periodic dropout check and checkpoint without a new reading.
+
+        ``update`` only does this when some reading arrives; call ``tick`` from
+        a timer so a silent broker or line is still reported.
+        """
+        return self._housekeeping(now)
+
+    def save_checkpoint(self, path: Optional[str] = None):
+        """Atomically write the detector state to disk."""
+        path = path or self.checkpoint_path
+        if not path:
+            return
+        n = len(self._names)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                names=np.array(self._names, dtype=str),
+                **{name: getattr(self, f"_{name}")[:n] for name in _STATE_ARRAYS},
+            )
+        os.replace(tmp_path, path)
+        self._last_checkpoint = time.time()
+        logger.debug(f"Saved anomaly detector checkpoint with {n} sensors to {path}")
+
+    def load_checkpoint(self, path: str):
+        """Restore detector state written by ``save_checkpoint``.
+
+        ``last_seen`` is reset to the load time so the downtime of this
+        process is not reported as a dropout of every sensor.
+        """
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                names = [str(name) for name in data["names"]]
+                self._allocate(max(len(names), 1))
+                for name in _STATE_ARRAYS:
+                    getattr(self, f"_{name}")[:len(names)] = data[name]
+        except Exception as e:
+            logger.error(f"Error loading anomaly detector checkpoint {path}: {str(e)}")
+            return
+
+        self._names = names
+        self._index = {name: i for i, name in enumerate(names)}
+        self._last_seen[:len(names)] = time.time()
+        self._flags[:len(names)] &= ~np.uint8(_DROPPED)
+        logger.info(f"Loaded anomaly detector state for {len(names)} sensors from {path}")
+
+    def _housekeeping(self, now: float) -> List[Anomaly]:
+        """Run the periodic dropout check and checkpoint."""
+        if now - self._last_housekeeping < self.housekeeping_interval:
+            return []
+        self._last_housekeeping = now
+        anomalies = self.check_dropouts(now)
+        if self.checkpoint_path and time.time() - self._last_checkpoint >= self.checkpoint_interval:
+            try:
+                self.save_checkpoint()
+            except Exception as e:
+                logger.error(f"Error saving anomaly detector checkpoint: {str(e)}")
+        return anomalies
+
+    def _slot(self, sensor_id: str, unit: Optional[str]) -> int:
+        """Return the state slot of a sensor, allocating one if needed."""
+        i = self._index.get(sensor_id)
+        if i is None:
+            i = len(self._names)
+            if i == len(self._mean):
+                self._grow(2 * len(self._mean))
+            self._index[sensor_id] = i
+            self._names.append(sensor_id)
+            self._flags[i] = _DISCRETE if unit in DISCRETE_UNITS else 0
+        return i
+
+    def _allocate(self, capacity: int):
+        self._mean = np.zeros(capacity, dtype=np.float64)
+        self._var = np.zeros(capacity, dtype=np.float64)
+        self._last_value = np.zeros(capacity, dtype=np.float64)
+        self._last_seen = np.zeros(capacity, dtype=np.float64)
+        self._count = np.zeros(capacity, dtype=np.uint32)
+        self._stuck = np.zeros(capacity, dtype=np.uint32)
+        self._flags = np.zeros(capacity, dtype=np.uint8)
+
+    def _grow(self, capacity: int):
+        for name in _STATE_ARRAYS:
+            old = getattr(self, f"_{name}")
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, f"_{name}", new)
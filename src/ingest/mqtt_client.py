@@ -2,21 +2,41 @@
 import paho.mqtt.client as mqtt
 from loguru import logger
 import json
-import os
-from dotenv import load_dotenv
-from datetime import datetime
+import threading
+import time
+from datetime import datetime, UTC
+from typing import Callable, List, Optional
 
-from ..db.database import SessionLocal
-from ..db.models import SensorReading
+from sqlalchemy.orm import Session
 
-# Load environment variables
-load_dotenv()
+from ..config import Settings, configure_logging, get_settings
+from ..db.database import SessionLocal
+from ..db.models import SensorReading, Alert
+from ..db.sensor_registry import SensorRegistry
+from .anomaly_detector import Anomaly, StreamingAnomalyDetector
 
 class MQTTClient:
-    def __init__(self):
-        self.broker = os.getenv("MQTT_BROKER", "localhost")
-        self.port = int(os.getenv("MQTT_PORT", "1883"))
-        self.topic = os.getenv("MQTT_TOPIC", "plant/sensors/#")
+    def __init__(self, settings: Optional[Settings] = None,
+                 session_factory: Callable[[], Session] = SessionLocal,
+                 detector: Optional[StreamingAnomalyDetector] = None,
+                 sensors: Optional[SensorRegistry] = None):
+        settings = settings or get_settings()
+        self.broker = settings.mqtt_broker
+        self.port = settings.mqtt_port
+        self.topic = settings.mqtt_topic
+        self.session_factory = session_factory
+        # Interning cache of external sensor ids -> integer keys
+        self.sensors = sensors if sensors is not None else SensorRegistry()
+        
+        # Streaming anomaly detection on every ingested reading
+        self.detector = detector if detector is not None else StreamingAnomalyDetector(
+            checkpoint_path=settings.anomaly_checkpoint_path
+        )
+        
+        # update() and the dropout timer share the detector state
+        self._detector_lock = threading.Lock()
+        self._stop_watchdog = threading.Event()
+        self._watchdog: Optional[threading.Thread] = None
         
         self.client = mqtt.Client()
         self.client.on_connect = self.on_connect
@@ -33,37 +53,101 @@ class MQTTClient:
         """Callback when a message is received from the broker."""
         try:
             payload = json.loads(msg.payload.decode())
-            reading = SensorReading(
-                time=datetime.utcnow(),
-                sensor_id=payload.get("sensor_id"),
-                value=payload.get("value"),
-                unit=payload.get("unit")
-            )
+            sensor_id = payload.get("sensor_id")
+            # Store the same float the detector checks
+            value = float(payload.get("value"))
+            unit = payload.get("unit")
+            
+            with self._detector_lock:
+                anomalies = self.detector.update(sensor_id, value, time.time(), unit)
             
             # Save to database
-            db = SessionLocal()
-            db.add(reading)
-            db.commit()
-            db.close()
+            db = self.session_factory()
+            try:
+                reading = SensorReading(
+                    time=datetime.utcnow(),
+                    sensor_key=self.sensors.get_or_create(db, sensor_id, unit, payload.get("machine")),
+                    value=value
+                )
+                db.add(reading)
+                self._add_alerts(db, anomalies)
+                db.commit()
+            finally:
+                db.close()
             
-            logger.debug(f"Saved sensor reading: {reading.sensor_id} = {reading.value} {reading.unit}")
+            logger.debug(f"Saved sensor reading: {sensor_id} = {value} {unit}")
             
         except Exception as e:
             logger.error(f"Error processing message: {str(e)}")
             
+    def check_dropouts(self):
+        """Record dropouts of silent sensors, even when no message arrives."""
+        try:
+            with self._detector_lock:
+                anomalies = self.detector.tick(time.time())
+            if not anomalies:
+                return
+            db = self.session_factory()
+            try:
+                self._add_alerts(db, anomalies)
+                db.commit()
+            finally:
+                db.close()
+        except Exception as e:
+            logger.error(f"Error checking sensor dropouts: {str(e)}")
+            
+    def start_watchdog(self, interval: Optional[float] = None):
+        """Run ``check_dropouts`` every ``interval`` seconds in a background thread."""
+        if self._watchdog is not None:
+            return
+        interval = interval if interval is not None else self.detector.housekeeping_interval
+        self._stop_watchdog.clear()
+        
+        def watch():
+            while not self._stop_watchdog.wait(interval):
+                self.check_dropouts()
+        
+        self._watchdog = threading.Thread(target=watch, name="dropout-watchdog", daemon=True)
+        self._watchdog.start()
+        
+    def stop_watchdog(self):
+        """Stop the dropout timer thread."""
+        if self._watchdog is None:
+            return
+        self._stop_watchdog.set()
+        self._watchdog.join()
+        self._watchdog = None
+            
+    def _add_alerts(self, db, anomalies: List[Anomaly]):
+        """Add an alert row for each detected anomaly to the session."""
+        for anomaly in anomalies:
+            db.add(Alert(
+                time=datetime.fromtimestamp(anomaly.timestamp, UTC),
+                kpi_name=anomaly.sensor_id,
+                severity=anomaly.severity,
+                message=anomaly.message,
+                acknowledged=0
+            ))
+            logger.warning(f"Sensor anomaly ({anomaly.kind}): {anomaly.message}")
+            
     def start(self):
         """Start the MQTT client and connect to broker."""
         try:
             logger.info(f"Connecting to MQTT broker at {self.broker}:{self.port}")
             self.client.connect(self.broker, self.port)
+            self.start_watchdog()
             self.client.loop_forever()
         except KeyboardInterrupt:
             logger.info("Stopping MQTT client...")
             self.client.disconnect()
+            self.stop_watchdog()
+            self.detector.save_checkpoint()
         except Exception as e:
             logger.error(f"Error in MQTT client: {str(e)}")
+            self.stop_watchdog()
             raise
 
 if __name__ == "__main__":
+    configure_logging()
     client = MQTTClient()
     client.start()
@@ -1,21 +1,87 @@
 """KPI calculation engine."""
+import math
 from loguru import logger
 from datetime import datetime, timedelta, UTC
-from sqlalchemy import func, and_
+from zoneinfo import ZoneInfo
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, Optional, Sequence, Tuple, Union
+import numpy as np
+from sqlalchemy import func, and_, case, extract, select
+from sqlalchemy.orm import Session
 
+from ..config import get_settings
 from ..db.database import SessionLocal
-from ..db.models import SensorReading, KPIValue, Alert
+from ..db.models import SensorReading, SensorSketch, KPIValue, Alert
+from ..db.lifecycle import ParquetArchive
+from ..db.sensor_registry import SensorRegistry
+from ..alerts.notifications import AlertEvent, NotificationDispatcher, build_dispatcher, classify_alert
+from .pane_cache import PaneAggregate, PaneCache
+from .rules import Evaluation, RuleStore
+from .sketches import DEFAULT_RELATIVE_ACCURACY, DDSketch, DistributionKPI
+from ..utils.timeutils import as_utc, floor_time
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Lecturas por bloque al recorrer históricos en forma columnar
+SERIES_CHUNK_SIZE = 50_000
+SERIES_SENSORS = ("STATUS001", "SPEED001", "QUALITY001")
+
+# Ancho de los buckets de sketches para KPIs de distribución
+SKETCH_BUCKET = timedelta(minutes=5)
+DEFAULT_QUANTILES = (0.5, 0.95, 0.99)
+
+# Valor por defecto de ``pane_cache``; ``None`` desactiva la caché
+_DEFAULT_PANE_CACHE = object()
 
 class KPIEngine:
-    def __init__(self):
-        self.db = SessionLocal()
-        # Configuración de umbrales para los KPIs
-        self.thresholds = {
-            "OEE": {"warning": 0.85, "critical": 0.75},
-            "availability": {"warning": 0.90, "critical": 0.80},
-            "performance": {"warning": 0.95, "critical": 0.85},
-            "quality": {"warning": 0.98, "critical": 0.95}
-        }
+    def __init__(self, db: Optional[Session] = None,
+                 pane_cache: Optional[PaneCache] = _DEFAULT_PANE_CACHE,
+                 sensors: Optional[SensorRegistry] = None,
+                 notifier: Optional[NotificationDispatcher] = None,
+                 sketch_bucket: timedelta = SKETCH_BUCKET,
+                 sketch_accuracy: float = DEFAULT_RELATIVE_ACCURACY,
+                 archive: Optional[ParquetArchive] = None,
+                 rules: Optional[RuleStore] = None,
+                 machine: Optional[str] = None,
+                 line: Optional[str] = None):
+        # La sesión se abre al primer uso si no se inyecta una
+        self._db = db
+        # Resolución de identificadores externos de sensores a claves enteras
+        self.sensors = sensors if sensors is not None else SensorRegistry()
+        # Notificaciones asíncronas de alertas, con los destinos configurados por defecto
+        self.notifier = notifier if notifier is not None else build_dispatcher(get_settings())
+        # Sketches de cuantiles persistidos por bucket de tiempo
+        self.sketch_bucket = sketch_bucket
+        self.sketch_accuracy = sketch_accuracy
+        # Un bucket se da por cerrado (y se guarda) solo pasado este margen para lecturas tardías
+        self.sketch_grace = timedelta(seconds=get_settings().late_reading_seconds)
+        # Archivo Parquet con las lecturas más antiguas que la retención
+        self.archive = archive if archive is not None else ParquetArchive(get_settings().archive_dir)
+        # Caché de agregados parciales para ventanas deslizantes solapadas
+        if pane_cache is _DEFAULT_PANE_CACHE:
+            pane_cache = PaneCache(lateness=timedelta(seconds=get_settings().late_reading_seconds))
+        self.pane_cache = pane_cache
+        # Reglas de umbrales y alertas, recargadas en caliente desde su archivo
+        self.rules = rules if rules is not None else RuleStore(get_settings().rules_path)
+        self.plant_timezone = ZoneInfo(get_settings().plant_timezone)
+        # Contexto para reglas específicas de máquina o línea
+        self.machine = machine
+        self.line = line
+
+    @property
+    def db(self) -> Session:
+        """Sesión de base de datos, abierta de forma perezosa."""
+        if self._db is None:
+            self._db = SessionLocal()
+        return self._db
+
+    @db.setter
+    def db(self, session: Session):
+        self._db = session
+
+    def close(self):
+        """Envía las notificaciones pendientes y detiene el despachador."""
+        self.notifier.stop()
         
     def calculate_oee(self, start_time: datetime, end_time: datetime) -> float:
         """Calcula el Overall Equipment Effectiveness (OEE)."""
@@ -28,14 +94,18 @@ class KPIEngine:
             # OEE es el producto de sus tres componentes
             oee = availability * performance * quality
             
+            # Estados y decisiones de alerta de todos los KPIs en una sola evaluación
+            kpis = {"availability": availability, "performance": performance, "quality": quality, "OEE": oee}
+            evaluation = self.evaluate_kpis(list(kpis), list(kpis.values()), end_time)
+            
             # Guarda los valores de KPI individuales
-            self._save_kpi_value("availability", availability, end_time)
-            self._save_kpi_value("performance", performance, end_time)
-            self._save_kpi_value("quality", quality, end_time)
-            self._save_kpi_value("OEE", oee, end_time)
+            for (kpi_name, value), status in zip(kpis.items(), evaluation.status):
+                self._save_kpi_value(kpi_name, value, end_time, str(status))
             
-            # Verifica si necesitamos generar alertas
-            self._check_and_create_alert("OEE", oee, end_time)
+            # Genera las alertas que indican las reglas
+            for (kpi_name, value), status, alert in zip(kpis.items(), evaluation.status, evaluation.alert):
+                if alert:
+                    self._create_alert(str(status), kpi_name, f"KPI {kpi_name} en estado {status} (valor: {value:.2%})")
             
             return oee
             
@@ -43,30 +113,349 @@ class KPIEngine:
             logger.error(f"Error calculando OEE: {str(e)}")
             return 0.0
 
-    def _calculate_availability(self, start_time: datetime, end_time: datetime) -> float:
-        """Calcula el componente de disponibilidad del OEE."""
+    def calculate_oee_series(self, start_time: datetime, end_time: datetime, step: timedelta,
+                             chunk_size: int = SERIES_CHUNK_SIZE) -> "pd.DataFrame":
+        """Calcula OEE y sus componentes para ventanas consecutivas de ``step``.
+
+        Equivale a llamar ``calculate_oee`` en cada ventana ``[inicio, fin]`` (sin
+        guardar resultados), pero recorre las lecturas una sola vez en bloques
+        columnares y agrega todas las ventanas con operaciones vectorizadas.
+        """
+        # pandas solo se importa en la ruta analítica para no penalizar el arranque
+        import pandas as pd
+
+        if step <= timedelta(0):
+            raise ValueError("step debe ser positivo")
         try:
-            # Obtiene las lecturas del sensor de estado de la máquina
-            running_count = self.db.query(func.count(SensorReading.time)).filter(
-                and_(
-                    SensorReading.sensor_id == "STATUS001",
-                    SensorReading.time.between(start_time, end_time),
-                    SensorReading.value >= 1
-                )
-            ).scalar() or 0
-            
-            total_count = self.db.query(func.count(SensorReading.time)).filter(
+            n_windows = max(-((start_time - end_time) // step), 0)
+            starts = pd.Series(pd.Timestamp(start_time) + pd.Timedelta(step) * np.arange(n_windows))
+            ends = (starts + pd.Timedelta(step)).clip(upper=pd.Timestamp(end_time))
+
+            totals = {name: np.zeros(n_windows) for name in (
+                "status_count", "status_running", "speed_count", "speed_sum", "quality_count", "quality_sum")}
+            keys = self.sensors.keys_for(self.db, SERIES_SENSORS)
+            if n_windows and keys:
+                chunks = self._reading_chunks(keys.values(), start_time, end_time, chunk_size)
+                for frame in _complete_timestamps(chunks):
+                    self._accumulate_series_chunk(frame, totals, keys, start_time, step, n_windows)
+
+            # Mismas reglas que los cálculos por ventana, aplicadas a todas a la vez
+            availability = np.divide(totals["status_running"], totals["status_count"],
+                                     out=np.ones(n_windows), where=totals["status_count"] > 0)
+            avg_speed = np.divide(totals["speed_sum"], totals["speed_count"],
+                                  out=np.zeros(n_windows), where=totals["speed_count"] > 0)
+            performance = np.where(avg_speed == 0.0, 1.0, np.minimum(avg_speed / 90.0, 0.90))
+            avg_quality = np.divide(totals["quality_sum"], totals["quality_count"],
+                                    out=np.zeros(n_windows), where=totals["quality_count"] > 0)
+            quality = np.where(avg_quality == 0.0, 1.0, avg_quality)
+
+            series = pd.DataFrame({
+                "start": starts,
+                "end": ends,
+                "availability": np.clip(availability, 0.0, 1.0),
+                "performance": np.clip(performance, 0.0, 1.0),
+                "quality": np.clip(quality, 0.0, 1.0),
+            })
+            series["OEE"] = series["availability"] * series["performance"] * series["quality"]
+
+            # Una sola evaluación de reglas para todas las ventanas y KPIs
+            kpi_names = ["availability", "performance", "quality", "OEE"]
+            local_ends = pd.to_datetime(ends, utc=True).dt.tz_convert(self.plant_timezone)
+            minutes = (local_ends.dt.hour * 60 + local_ends.dt.minute).to_numpy()
+            evaluation = self.rules.compiled().evaluate(
+                np.repeat(kpi_names, n_windows),
+                series[kpi_names].to_numpy().T.reshape(-1),
+                self.machine,
+                self.line,
+                np.tile(minutes, len(kpi_names))
+            )
+            for i, kpi_name in enumerate(kpi_names):
+                series[f"{kpi_name}_status"] = evaluation.status[i * n_windows:(i + 1) * n_windows]
+            return series
+
+        except Exception as e:
+            logger.error(f"Error calculando serie de OEE: {str(e)}")
+            raise
+
+    def export_readings(self, start_time: datetime, end_time: datetime,
+                        sensor_ids: Optional[Iterable[str]] = None) -> "pd.DataFrame":
+        """Exporta lecturas crudas con el identificador externo y la unidad de cada sensor."""
+        import pandas as pd
+
+        keys = self.sensors.keys_for(self.db, sensor_ids).values() if sensor_ids is not None else None
+        frames = list(self._reading_chunks(keys, start_time, end_time))
+        readings = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(
+            {"time": pd.Series(dtype="datetime64[us, UTC]"), "sensor_key": [], "value": []})
+        readings = readings.sort_values(["time", "sensor_key"], kind="stable").reset_index(drop=True)
+        info = self.sensors.info_for_keys(self.db, readings["sensor_key"].unique())
+        sensor_key = readings.pop("sensor_key")
+        readings.insert(1, "sensor_id", sensor_key.map({k: v.name for k, v in info.items()}))
+        readings["unit"] = sensor_key.map({k: v.unit for k, v in info.items()})
+        readings["machine"] = sensor_key.map({k: v.machine for k, v in info.items()})
+        return readings
+
+    def _reading_chunks(self, sensor_keys: Optional[Iterable[int]], start_time: datetime, end_time: datetime,
+                        chunk_size: Optional[int] = None) -> Iterator["pd.DataFrame"]:
+        """Lee lecturas de [start_time, end_time] por bloques ordenados por tiempo.
+
+        La parte anterior a la marca de archivo se lee de Parquet y el resto de
+        la base de datos; ``time`` se devuelve siempre en UTC.
+        """
+        import pandas as pd
+
+        if sensor_keys is not None:
+            sensor_keys = list(sensor_keys)
+        archived, live = self._split_at_archive(start_time, end_time, True)
+        if archived:
+            yield from self.archive.iter_days(*archived, sensor_keys=sensor_keys)
+        if live is None:
+            return
+
+        lower, upper, _ = live
+        query = select(SensorReading.time, SensorReading.sensor_key, SensorReading.value).where(
+            SensorReading.time.between(lower, upper)
+        ).order_by(SensorReading.time)
+        if sensor_keys is not None:
+            query = query.where(SensorReading.sensor_key.in_(sensor_keys))
+        if chunk_size is not None:
+            # Cursor de servidor: sin esto psycopg2 trae todo el resultado antes del primer bloque
+            query = query.execution_options(stream_results=True)
+        chunks = pd.read_sql(query, self.db.connection(), chunksize=chunk_size)
+        for chunk in ([chunks] if chunk_size is None else chunks):
+            chunk["time"] = pd.to_datetime(chunk["time"], utc=True)
+            yield chunk
+
+    def _split_at_archive(self, lower: datetime, upper: datetime, include_upper: bool):
+        """Divide un rango en la parte archivada en Parquet y la que sigue en la base de datos."""
+        watermark = self.archive.watermark() if self.archive is not None else None
+        if watermark is None or as_utc(lower) >= watermark:
+            return None, (lower, upper, include_upper)
+        if as_utc(upper) < watermark:
+            return (lower, upper, include_upper), None
+        live = (watermark, upper, include_upper) if as_utc(upper) > watermark or include_upper else None
+        return (lower, watermark, False), live
+
+    def _accumulate_series_chunk(self, frame: "pd.DataFrame", totals: dict, keys: dict,
+                                 start_time: datetime, step: timedelta, n_windows: int):
+        """Suma las lecturas de un bloque a los acumuladores de cada ventana."""
+        import pandas as pd
+
+        times = _to_utc_ns(frame["time"])
+        offsets = times - _to_utc_ns(pd.Series([start_time]))[0]
+        step_ns = pd.Timedelta(step).value
+        window = offsets // step_ns
+
+        # Las ventanas son cerradas: una lectura en el límite pertenece a ambas ventanas
+        inside = window < n_windows
+        on_boundary = (offsets % step_ns == 0) & (window > 0)
+        rows = np.concatenate([np.flatnonzero(inside), np.flatnonzero(on_boundary)])
+        window = np.concatenate([window[inside], window[on_boundary] - 1])
+        times = times[rows]
+        sensors = frame["sensor_key"].to_numpy()[rows]
+        values = frame["value"].to_numpy(dtype=float)[rows]
+
+        def add(name, mask, weights=None):
+            totals[name] += np.bincount(window[mask], weights=None if weights is None else weights[mask],
+                                        minlength=n_windows)
+
+        is_status = sensors == keys.get("STATUS001", -1)
+        is_running = is_status & (values >= 1)
+        add("status_count", is_status)
+        add("status_running", is_running)
+
+        # Velocidad solo en instantes con la máquina en funcionamiento
+        is_speed = (sensors == keys.get("SPEED001", -1)) & np.isin(times, times[is_running])
+        add("speed_count", is_speed)
+        add("speed_sum", is_speed, values)
+
+        is_quality = sensors == keys.get("QUALITY001", -1)
+        add("quality_count", is_quality)
+        add("quality_sum", is_quality, values)
+
+    def evaluate_kpis(self, kpi_names: Sequence[str], values: Sequence[float],
+                      timestamp: Optional[datetime] = None,
+                      machines: Union[None, str, Sequence[Optional[str]]] = None,
+                      lines: Union[None, str, Sequence[Optional[str]]] = None) -> Evaluation:
+        """Evalúa estado y alerta de un lote de valores de KPI en una sola pasada vectorizada."""
+        minutes = None
+        if timestamp is not None:
+            local = as_utc(timestamp).astimezone(self.plant_timezone)
+            minutes = local.hour * 60 + local.minute
+        return self.rules.compiled().evaluate(
+            kpi_names,
+            values,
+            machines if machines is not None else self.machine,
+            lines if lines is not None else self.line,
+            minutes
+        )
+
+    def calculate_distribution(self, sensor_id: str, start_time: datetime, end_time: datetime,
+                               quantiles: Sequence[float] = DEFAULT_QUANTILES) -> DistributionKPI:
+        """Calcula percentiles de un sensor en [start_time, end_time] combinando sketches.
+
+        Los buckets completos y ya cerrados se leen de ``sensor_sketches`` (o se
+        construyen y guardan una sola vez); solo los bordes de la ventana se
+        leen de las lecturas crudas. El error relativo de cada percentil está
+        acotado por ``sketch_accuracy``.
+        """
+        sketch = DDSketch(self.sketch_accuracy)
+        key = self.sensors.key_for(self.db, sensor_id)
+        if key is not None:
+            # Buckets alineados a la época UTC, sea cual sea la zona horaria de la ventana
+            start, end = as_utc(start_time), as_utc(end_time)
+            size = self.sketch_bucket
+            first_bucket = floor_time(start, size)
+            if first_bucket < start:
+                first_bucket += size
+            last_bucket_end = floor_time(end, size)
+
+            if last_bucket_end <= first_bucket:
+                sketch.add_many(self._fetch_values(key, start, end, True)[1])
+            else:
+                if start < first_bucket:
+                    sketch.add_many(self._fetch_values(key, start, first_bucket, False)[1])
+                for bucket_sketch in self._bucket_sketches(key, first_bucket, last_bucket_end):
+                    sketch.merge(bucket_sketch)
+                sketch.add_many(self._fetch_values(key, last_bucket_end, end, True)[1])
+
+        return DistributionKPI(
+            sensor_id=sensor_id,
+            start=start_time,
+            end=end_time,
+            count=sketch.count,
+            relative_accuracy=self.sketch_accuracy,
+            quantiles={q: sketch.quantile(q) for q in quantiles},
+            min=sketch.min if sketch.count else None,
+            max=sketch.max if sketch.count else None,
+            mean=sketch.sum / sketch.count if sketch.count else None
+        )
+
+    def _bucket_sketches(self, sensor_key: int, first_bucket: datetime, last_bucket_end: datetime):
+        """Devuelve un sketch por bucket completo, construyendo los que faltan.
+
+        Un sketch guardado cuyo ``count`` ya no coincide con las lecturas en la
+        base de datos (llegaron lecturas tardías) se reconstruye y se sobrescribe.
+        """
+        size = self.sketch_bucket
+        bucket_seconds = int(size.total_seconds())
+        rows = self.db.query(SensorSketch).filter(
+            and_(
+                SensorSketch.sensor_key == sensor_key,
+                SensorSketch.bucket_seconds == bucket_seconds,
+                SensorSketch.bucket_start >= first_bucket,
+                SensorSketch.bucket_start < last_bucket_end
+            )
+        ).all()
+        persisted = {as_utc(row.bucket_start): row.count for row in rows}
+        stored = {as_utc(row.bucket_start): DDSketch.from_json(row.sketch) for row in rows}
+        # Sketches guardados con otra precisión no se pueden combinar: se recalculan
+        stored = {start: s for start, s in stored.items() if math.isclose(s.relative_accuracy, self.sketch_accuracy)}
+        # Conteo agrupado (sin leer valores) para detectar sketches a los que les faltan lecturas
+        counts = self._live_bucket_counts(sensor_key, first_bucket, last_bucket_end)
+        stale = {start for start in stored if start in counts and counts[start] != persisted[start]}
+        for start in stale:
+            del stored[start]
+
+        n_buckets = (last_bucket_end - first_bucket) // size
+        missing = [i for i in range(n_buckets) if first_bucket + i * size not in stored]
+        closed_until = datetime.now(UTC) - self.sketch_grace
+        new_rows = []
+        for run in _contiguous_runs(missing):
+            # Una lectura cruda por tramo contiguo sin sketches; los buckets guardados no se releen
+            lower = first_bucket + run[0] * size
+            upper = first_bucket + (run[-1] + 1) * size
+            times, values = self._fetch_values(sensor_key, lower, upper, False)
+            bucket_index = (times - first_bucket.timestamp()) // size.total_seconds()
+            for i in run:
+                bucket_start = first_bucket + i * size
+                bucket_sketch = DDSketch(self.sketch_accuracy)
+                bucket_sketch.add_many(values[bucket_index == i])
+                stored[bucket_start] = bucket_sketch
+                # Solo se persisten buckets cerrados, pasado el margen para lecturas tardías
+                if bucket_start + size <= closed_until and (bucket_start not in persisted or bucket_start in stale):
+                    new_rows.append(SensorSketch(
+                        bucket_start=bucket_start,
+                        sensor_key=sensor_key,
+                        bucket_seconds=bucket_seconds,
+                        count=bucket_sketch.count,
+                        sketch=bucket_sketch.to_json()
+                    ))
+        self._save_sketches(new_rows)
+
+        return stored.values()
+
+    def _live_bucket_counts(self, sensor_key: int, first_bucket: datetime, last_bucket_end: datetime) -> Dict[datetime, int]:
+        """Cuenta las lecturas por bucket en la parte del rango que sigue en la base de datos.
+
+        Los buckets sin lecturas no aparecen; el tramo archivado no cambia y no se cuenta.
+        """
+        _, live = self._split_at_archive(first_bucket, last_bucket_end, False)
+        if live is None:
+            return {}
+        lower, upper, _ = live
+        seconds = int(self.sketch_bucket.total_seconds())
+        bucket_index = self._epoch_bucket(SensorReading.time, seconds).label("bucket")
+        rows = self.db.query(bucket_index, func.count(SensorReading.time)).filter(
+            and_(
+                SensorReading.sensor_key == sensor_key,
+                SensorReading.time >= lower,
+                SensorReading.time < upper
+            )
+        ).group_by(bucket_index).all()
+        counts = {datetime.fromtimestamp(int(index) * seconds, UTC): count for index, count in rows}
+        # Un bucket guardado sin lecturas en la base de datos tiene conteo 0
+        bucket = as_utc(lower)
+        while bucket < as_utc(upper):
+            counts.setdefault(bucket, 0)
+            bucket += self.sketch_bucket
+        return counts
+
+    def _save_sketches(self, rows: list):
+        """Guarda sketches de buckets cerrados, sobrescribiendo los reconstruidos."""
+        if not rows:
+            return
+        try:
+            for row in rows:
+                self.db.merge(row)
+            self.db.commit()
+        except Exception as e:
+            logger.error(f"Error guardando sketches: {str(e)}")
+            self.db.rollback()
+
+    def _fetch_values(self, sensor_key: int, lower: datetime, upper: datetime,
+                      include_upper: bool) -> Tuple[np.ndarray, np.ndarray]:
+        """Lee lecturas crudas de un sensor como arreglos (epoch en segundos, valor)."""
+        archived, live = self._split_at_archive(lower, upper, include_upper)
+        times, values = [], []
+        if archived:
+            frame = self.archive.read(*archived, sensor_keys=[sensor_key])
+            times.append(frame["time"].astype("datetime64[us, UTC]").astype("int64").to_numpy() / 1e6)
+            values.append(frame["value"].to_numpy(dtype=float))
+        if live:
+            lower, upper, include_upper = live
+            upper_bound = SensorReading.time <= upper if include_upper else SensorReading.time < upper
+            rows = self.db.query(SensorReading.time, SensorReading.value).filter(
                 and_(
-                    SensorReading.sensor_id == "STATUS001",
-                    SensorReading.time.between(start_time, end_time)
+                    SensorReading.sensor_key == sensor_key,
+                    SensorReading.time >= lower,
+                    upper_bound
                 )
-            ).scalar() or 0
+            ).all()
+            times.append(np.array([as_utc(t).timestamp() for t, _ in rows], dtype=float))
+            values.append(np.array([v for _, v in rows], dtype=float))
+        return np.concatenate(times), np.concatenate(values)
+
+    def _calculate_availability(self, start_time: datetime, end_time: datetime) -> float:
+        """Calcula el componente de disponibilidad del OEE."""
+        try:
+            # Lecturas del sensor de estado de la máquina (total y en funcionamiento)
+            status = self._window_aggregate("STATUS001", start_time, end_time)
             
-            if total_count == 0:
+            if status.count == 0:
                 return 1.0  # Si no hay datos, asumimos 100% disponibilidad
             
             # Calcula la disponibilidad basada en el tiempo de operación
-            availability = running_count / total_count
+            availability = status.running_count / status.count
             return min(max(availability, 0.0), 1.0)  # Limita entre 0 y 1
             
         except Exception as e:
@@ -79,23 +468,9 @@ class KPIEngine:
             # Velocidad ideal = velocidad de prueba (90 unidades/hora)
             ideal_speed = 90.0
             
-            # Obtiene la velocidad promedio del sensor cuando la máquina está en funcionamiento
-            avg_speed = self.db.query(func.avg(SensorReading.value)).filter(
-                and_(
-                    SensorReading.sensor_id == "SPEED001",
-                    SensorReading.time.between(start_time, end_time),
-                    # Solo considerar velocidad cuando la máquina está funcionando
-                    SensorReading.time.in_(
-                        self.db.query(SensorReading.time).filter(
-                            and_(
-                                SensorReading.sensor_id == "STATUS001",
-                                SensorReading.value >= 1,
-                                SensorReading.time.between(start_time, end_time)
-                            )
-                        )
-                    )
-                )
-            ).scalar() or 0.0
+            # Velocidad promedio del sensor solo cuando la máquina está en funcionamiento
+            speed = self._window_aggregate("SPEED001", start_time, end_time, running_only=True)
+            avg_speed = speed.mean or 0.0
             
             if avg_speed == 0.0:
                 return 1.0  # Si no hay datos, asumimos 100% rendimiento
@@ -116,12 +491,7 @@ class KPIEngine:
         """Calcula el componente de calidad del OEE."""
         try:
             # Obtener el promedio de calidad directamente del sensor
-            quality = self.db.query(func.avg(SensorReading.value)).filter(
-                and_(
-                    SensorReading.sensor_id == "QUALITY001",
-                    SensorReading.time.between(start_time, end_time)
-                )
-            ).scalar() or 1.0  # Si no hay datos, asumimos 100% calidad
+            quality = self._window_aggregate("QUALITY001", start_time, end_time).mean or 1.0  # Si no hay datos, asumimos 100% calidad
             
             return min(max(float(quality), 0.0), 1.0)  # Limitar entre 0 y 1
             
@@ -129,13 +499,153 @@ class KPIEngine:
             logger.error(f"Error calculando calidad: {str(e)}")
             return 0.0
 
-    def _save_kpi_value(self, kpi_name: str, value: float, timestamp: datetime):
+    def _window_aggregate(self, sensor_id: str, start_time: datetime, end_time: datetime,
+                          running_only: bool = False) -> PaneAggregate:
+        """Agrega un sensor en [start_time, end_time] combinando paneles en caché."""
+        key = f"{sensor_id}@running" if running_only else sensor_id
+
+        def compute(lower: datetime, upper: datetime, include_upper: bool) -> PaneAggregate:
+            return self._aggregate_range(sensor_id, lower, upper, include_upper, running_only)
+
+        def compute_panes(lower: datetime, upper: datetime) -> Dict[datetime, PaneAggregate]:
+            return self._aggregate_panes(sensor_id, lower, upper, running_only)
+
+        if self.pane_cache is None:
+            return compute(start_time, end_time, True)
+        return self.pane_cache.aggregate(key, start_time, end_time, compute, compute_panes)
+
+    def _aggregate_range(self, sensor_id: str, lower: datetime, upper: datetime,
+                         include_upper: bool, running_only: bool = False) -> PaneAggregate:
+        """Consulta count, suma y lecturas en funcionamiento de un sensor en un rango."""
+        keys = self.sensors.keys_for(self.db, [sensor_id, "STATUS001"])
+        if sensor_id not in keys or (running_only and "STATUS001" not in keys):
+            return PaneAggregate()  # Sensor sin lecturas registradas
+
+        # La parte anterior a la marca de archivo se agrega desde Parquet
+        archived, live = self._split_at_archive(lower, upper, include_upper)
+        result = PaneAggregate()
+        if archived:
+            result += self._aggregate_archive(keys[sensor_id], keys.get("STATUS001"), *archived, running_only)
+        if live is None:
+            return result
+
+        count, total, running_count = self.db.query(
+            *self._aggregate_columns()
+        ).filter(self._range_conditions(keys, sensor_id, *live, running_only)).one()
+
+        return result + PaneAggregate(
+            count=count or 0,
+            total=float(total or 0.0),
+            running_count=int(running_count or 0)
+        )
+
+    def _aggregate_panes(self, sensor_id: str, lower: datetime, upper: datetime,
+                         running_only: bool = False) -> Dict[datetime, PaneAggregate]:
+        """Agrega un sensor por panel en [lower, upper) con una sola consulta agrupada.
+
+        Devuelve solo los paneles con lecturas, indexados por su inicio en UTC.
+        """
+        keys = self.sensors.keys_for(self.db, [sensor_id, "STATUS001"])
+        if sensor_id not in keys or (running_only and "STATUS001" not in keys):
+            return {}
+
+        size = self.pane_cache.pane_size
+        panes = {}
+        archived, live = self._split_at_archive(lower, upper, False)
+        seconds = int(size.total_seconds())
+        if archived:
+            # Una sola lectura del tramo archivado, agrupada por panel en memoria
+            readings = self._archived_readings(keys[sensor_id], keys.get("STATUS001"), *archived, running_only)
+            epoch = readings["time"].astype("datetime64[us, UTC]").astype("int64").to_numpy() // 1_000_000
+            grouped = readings.assign(pane=epoch // seconds, running=readings["value"] >= 1).groupby("pane").agg(
+                count=("value", "size"), total=("value", "sum"), running_count=("running", "sum")
+            )
+            for index, row in grouped.iterrows():
+                panes[datetime.fromtimestamp(int(index) * seconds, UTC)] = PaneAggregate(
+                    count=int(row["count"]),
+                    total=float(row["total"]),
+                    running_count=int(row["running_count"])
+                )
+        if live is None:
+            return panes
+
+        pane_index = self._epoch_bucket(SensorReading.time, seconds).label("pane")
+        rows = self.db.query(pane_index, *self._aggregate_columns()).filter(
+            self._range_conditions(keys, sensor_id, *live, running_only)
+        ).group_by(pane_index).all()
+
+        for index, count, total, running_count in rows:
+            panes[datetime.fromtimestamp(int(index) * seconds, UTC)] = PaneAggregate(
+                count=count or 0,
+                total=float(total or 0.0),
+                running_count=int(running_count or 0)
+            )
+        return panes
+
+    @staticmethod
+    def _aggregate_columns():
+        """Columnas de count, suma y lecturas en funcionamiento de ``PaneAggregate``."""
+        return (
+            func.count(SensorReading.time),
+            func.sum(SensorReading.value),
+            func.sum(case((SensorReading.value >= 1, 1), else_=0))
+        )
+
+    def _range_conditions(self, keys: dict, sensor_id: str, lower: datetime, upper: datetime,
+                          include_upper: bool, running_only: bool):
+        """Filtro de lecturas de un sensor en un rango, opcionalmente solo en funcionamiento."""
+        def time_range(column):
+            upper_bound = column <= upper if include_upper else column < upper
+            return and_(column >= lower, upper_bound)
+
+        conditions = [SensorReading.sensor_key == keys[sensor_id], time_range(SensorReading.time)]
+        if running_only:
+            # Solo considerar lecturas en instantes en que la máquina está funcionando
+            conditions.append(
+                SensorReading.time.in_(
+                    self.db.query(SensorReading.time).filter(
+                        and_(
+                            SensorReading.sensor_key == keys["STATUS001"],
+                            SensorReading.value >= 1,
+                            time_range(SensorReading.time)
+                        )
+                    )
+                )
+            )
+        return and_(*conditions)
+
+    def _epoch_bucket(self, column, seconds: int):
+        """Índice de bucket de ``seconds`` segundos contado desde la época Unix."""
+        epoch = extract("epoch", column)
+        if self.db.get_bind().dialect.name == "postgresql":
+            return func.floor(epoch / seconds)
+        # SQLite devuelve la época como entero y divide de forma entera
+        return epoch // seconds
+
+    def _aggregate_archive(self, sensor_key: int, status_key: Optional[int], lower: datetime, upper: datetime,
+                           include_upper: bool, running_only: bool) -> PaneAggregate:
+        """Equivalente de ``_aggregate_range`` sobre lecturas archivadas en Parquet."""
+        readings = self._archived_readings(sensor_key, status_key, lower, upper, include_upper, running_only)
+        return PaneAggregate(
+            count=len(readings),
+            total=float(readings["value"].sum()),
+            running_count=int((readings["value"] >= 1).sum())
+        )
+
+    def _archived_readings(self, sensor_key: int, status_key: Optional[int], lower: datetime, upper: datetime,
+                           include_upper: bool, running_only: bool) -> "pd.DataFrame":
+        """Lecturas archivadas de un sensor, opcionalmente solo con la máquina en funcionamiento."""
+        wanted = [sensor_key, status_key] if running_only else [sensor_key]
+        frame = self.archive.read(lower, upper, include_upper, sensor_keys=wanted)
+        readings = frame[frame["sensor_key"] == sensor_key]
+        if running_only:
+            status = frame[frame["sensor_key"] == status_key]
+            readings = readings[readings["time"].isin(status.loc[status["value"] >= 1, "time"])]
+        return readings
+
+    def _save_kpi_value(self, kpi_name: str, value: float, timestamp: datetime, status: str):
         """Guarda un valor de KPI en la base de datos."""
         try:
-            status = self._get_status(value, 
-                                    self.thresholds[kpi_name]["warning"],
-                                    self.thresholds[kpi_name]["critical"])
-            
             kpi = KPIValue(
                 time=timestamp,
                 kpi_name=kpi_name,
@@ -150,29 +660,10 @@ class KPIEngine:
             logger.error(f"Error guardando valor de KPI {kpi_name}: {str(e)}")
             self.db.rollback()
 
-    def _get_status(self, value: float, warning_threshold: float, critical_threshold: float) -> str:
-        """Determina el estado del KPI basado en umbrales."""
-        if value >= warning_threshold:
-            return "normal"
-        elif value >= critical_threshold:
-            return "warning"
-        else:
-            return "critical"
-
-    def _check_and_create_alert(self, kpi_name: str, value: float, timestamp: datetime):
-        """Verifica si se necesita crear una alerta basada en el valor del KPI."""
-        status = self._get_status(value, 
-                                self.thresholds[kpi_name]["warning"],
-                                self.thresholds[kpi_name]["critical"])
-        
-        if status != "normal":
-            severity = status
-            message = f"KPI {kpi_name} en estado {status} (valor: {value:.2%})"
-            self._create_alert(severity, kpi_name, message)
-
     def _create_alert(self, severity: str, kpi_name: str, message: str):
         """Crea una nueva alerta en la base de datos."""
         try:
+            kind = classify_alert(self.db, kpi_name, severity)
             alert = Alert(
                 time=datetime.now(UTC),
                 kpi_name=kpi_name,
@@ -185,6 +676,54 @@ class KPIEngine:
             self.db.commit()
             logger.warning(f"Alerta creada: {message}")
             
+            # Se encola sin bloquear el cálculo de KPIs
+            self.notifier.publish(AlertEvent(kind, kpi_name, severity, message, alert.time, alert.id))
+            
         except Exception as e:
             logger.error(f"Error creando alerta: {str(e)}")
             self.db.rollback()
+
+
+def _to_utc_ns(times: "pd.Series") -> np.ndarray:
+    """Convierte marcas de tiempo a nanosegundos UTC (las naive se asumen UTC)."""
+    import pandas as pd
+
+    times = pd.to_datetime(times)
+    if times.dt.tz is not None:
+        times = times.dt.tz_convert("UTC").dt.tz_localize(None)
+    return times.astype("datetime64[ns]").to_numpy().view("int64")
+
+
+def _contiguous_runs(indices: Sequence[int]) -> Iterator[list]:
+    """Agrupa índices crecientes en tramos de valores consecutivos."""
+    run = []
+    for i in indices:
+        if run and i != run[-1] + 1:
+            yield run
+            run = []
+        run.append(i)
+    if run:
+        yield run
+
+
+def _complete_timestamps(chunks: Iterable["pd.DataFrame"]) -> Iterator["pd.DataFrame"]:
+    """Reagrupa bloques ordenados por tiempo para no partir un mismo instante.
+
+    Las filas con la última marca de tiempo de cada bloque se retienen hasta el
+    siguiente, de modo que estado y velocidad simultáneos llegan juntos.
+    """
+    import pandas as pd
+
+    carry = None
+    for chunk in chunks:
+        if carry is not None:
+            chunk = pd.concat([carry, chunk], ignore_index=True)
+        if chunk.empty:
+            continue
+        last = chunk["time"].iloc[-1]
+        held = (chunk["time"] == last).to_numpy()
+        carry = chunk[held]
+        if not held.all():
+            yield chunk[~held]
+    if carry is not None and not carry.empty:
+        yield carry
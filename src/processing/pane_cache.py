@@ -0,0 +1,136 @@
+"""Pane-based partial aggregate cache for sliding KPI windows."""
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta, UTC
+from typing import Callable, Dict, Optional
+
+from ..utils.timeutils import as_utc, floor_time
+
+DEFAULT_PANE_SIZE = timedelta(minutes=1)
+DEFAULT_MAX_PANES = 10_000  # per series
+DEFAULT_LATENESS = timedelta(minutes=2)
+
+
+@dataclass(frozen=True)
+class PaneAggregate:
+    """Partial aggregate of one sensor series over a time range."""
+    count: int = 0
+    total: float = 0.0
+    running_count: int = 0
+
+    def __add__(self, other: "PaneAggregate") -> "PaneAggregate":
+        return PaneAggregate(
+            count=self.count + other.count,
+            total=self.total + other.total,
+            running_count=self.running_count + other.running_count,
+        )
+
+    @property
+    def mean(self) -> Optional[float]:
+        """Average value, or None when the range had no readings."""
+        return self.total / self.count if self.count else None
+
+
+# compute(lower, upper, include_upper) -> aggregate over [lower, upper) or [lower, upper]
+AggregateFn = Callable[[datetime, datetime, bool], PaneAggregate]
+# compute_panes(first_pane, end) -> {pane_start: aggregate} for the non-empty panes in [first_pane, end)
+PanesFn = Callable[[datetime, datetime], Dict[datetime, PaneAggregate]]
+
+
+class PaneCache:
+    """LRU cache of per-series aggregates over fixed, UTC epoch-aligned panes.
+
+    A window ``[start, end]`` is split into a left edge, a run of whole panes
+    and a right edge. Whole panes are served from the cache when possible; the
+    uncached ones are computed together in a single grouped call and the edges
+    separately, so sliding a window costs work proportional to the slide, not
+    to the window length.
+
+    Each series has its own LRU of up to ``max_panes`` panes, so series that
+    share the cache cannot evict each other's windows; windows with more panes
+    than that are aggregated directly. Panes ending less than ``lateness``
+    before now are computed but not cached, because readings stamped inside
+    them may still be in flight from ingest.
+    """
+
+    def __init__(self, pane_size: timedelta = DEFAULT_PANE_SIZE, max_panes: int = DEFAULT_MAX_PANES,
+                 lateness: timedelta = DEFAULT_LATENESS):
+        if pane_size <= timedelta(0):
+            raise ValueError("pane_size must be positive")
+        if max_panes < 1:
+            raise ValueError("max_panes must be at least 1")
+        if lateness < timedelta(0):
+            raise ValueError("lateness must not be negative")
+        self.pane_size = pane_size
+        self.max_panes = max_panes
+        self.lateness = lateness
+        self._series: "Dict[str, OrderedDict[datetime, PaneAggregate]]" = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return sum(len(panes) for panes in self._series.values())
+
+    def get(self, key: str, pane_start: datetime) -> Optional[PaneAggregate]:
+        """Return a cached pane and mark it as recently used."""
+        panes = self._series.get(key)
+        aggregate = panes.get(pane_start) if panes is not None else None
+        if aggregate is not None:
+            panes.move_to_end(pane_start)
+        return aggregate
+
+    def put(self, key: str, pane_start: datetime, aggregate: PaneAggregate):
+        """Store a pane, evicting the series' least recently used ones if full."""
+        panes = self._series.setdefault(key, OrderedDict())
+        panes[pane_start] = aggregate
+        panes.move_to_end(pane_start)
+        while len(panes) > self.max_panes:
+            panes.popitem(last=False)
+
+    def invalidate(self, since: Optional[datetime] = None):
+        """Drop cached panes ending after ``since`` (all panes if omitted)."""
+        if since is None:
+            self._series.clear()
+            return
+        since = as_utc(since)
+        for panes in self._series.values():
+            for pane_start in [p for p in panes if p + self.pane_size > since]:
+                del panes[pane_start]
+
+    def aggregate(self, key: str, start: datetime, end: datetime,
+                  compute: AggregateFn, compute_panes: PanesFn,
+                  now: Optional[datetime] = None) -> PaneAggregate:
+        """Aggregate ``key`` over the closed window ``[start, end]``.
+
+        Pane starts passed to ``compute_panes`` and expected back are aware UTC.
+        """
+        start, end = as_utc(start), as_utc(end)
+        first_pane = floor_time(start, self.pane_size)
+        if first_pane < start:
+            first_pane += self.pane_size
+        last_pane_end = floor_time(end, self.pane_size)
+
+        # The window does not cover any whole pane, or its panes would not fit
+        n_panes = (last_pane_end - first_pane) // self.pane_size
+        if n_panes <= 0 or n_panes > self.max_panes:
+            return compute(start, end, True)
+
+        settled_until = as_utc(now or datetime.now(UTC)) - self.lateness
+        panes = [first_pane + i * self.pane_size for i in range(n_panes)]
+        found = {pane: self.get(key, pane) for pane in panes}
+        missing = [pane for pane in panes if found[pane] is None]
+        self.hits += n_panes - len(missing)
+        self.misses += len(missing)
+        if missing:
+            computed = compute_panes(missing[0], missing[-1] + self.pane_size)
+            for pane in missing:
+                found[pane] = computed.get(pane, PaneAggregate())
+                if pane + self.pane_size <= settled_until:
+                    self.put(key, pane, found[pane])
+
+        result = PaneAggregate()
+        if start < first_pane:
+            result += compute(start, first_pane, False)
+        for pane in panes:
+            result += found[pane]
+        return result + compute(last_pane_end, end, True)
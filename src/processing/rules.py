@@ -0,0 +1,225 @@
+"""Configurable KPI threshold and alert rules, compiled for batch evaluation."""
+import json
+import os
+from dataclasses import asdict, dataclass
+from datetime import time
+from typing import Dict, List, NamedTuple, Optional, Sequence, Union
+
+import numpy as np
+from loguru import logger
+
+STATUSES = np.array(["normal", "warning", "critical"])
+
+
+@dataclass(frozen=True)
+class ThresholdRule:
+    """Warning/critical thresholds for a KPI, optionally scoped.
+
+    A rule may be restricted to a machine, a line and a shift (local time of
+    day, ``shift_end`` exclusive; overnight shifts wrap past midnight). When
+    several rules match a value the most specific one wins (machine, then
+    line, then shift); ties go to the rule listed last.
+    """
+    kpi_name: str
+    warning: float
+    critical: float
+    machine: Optional[str] = None
+    line: Optional[str] = None
+    shift_start: Optional[time] = None
+    shift_end: Optional[time] = None
+    alert: bool = True
+
+    def __post_init__(self):
+        if self.critical > self.warning:
+            raise ValueError(f"critical threshold above warning threshold for {self.kpi_name}")
+        if (self.shift_start is None) != (self.shift_end is None):
+            raise ValueError("shift_start and shift_end must be given together")
+
+    def to_dict(self) -> dict:
+        data = asdict(self)
+        for key in ("shift_start", "shift_end"):
+            if data[key] is not None:
+                data[key] = data[key].isoformat(timespec="minutes")
+        return data
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ThresholdRule":
+        data = dict(data)
+        for key in ("shift_start", "shift_end"):
+            if isinstance(data.get(key), str):
+                data[key] = time.fromisoformat(data[key])
+        return cls(**data)
+
+
+# Thresholds the KPI engine has always used; only OEE raises alerts
+DEFAULT_RULES = (
+    ThresholdRule("OEE", warning=0.85, critical=0.75),
+    ThresholdRule("availability", warning=0.90, critical=0.80, alert=False),
+    ThresholdRule("performance", warning=0.95, critical=0.85, alert=False),
+    ThresholdRule("quality", warning=0.98, critical=0.95, alert=False),
+)
+
+
+class Evaluation(NamedTuple):
+    """Result of evaluating a batch of KPI values."""
+    status: np.ndarray  # 'normal', 'warning' or 'critical'
+    alert: np.ndarray  # True where an alert must be raised
+    rule: np.ndarray  # index of the matching rule, -1 if none matched
+
+
+def _minute_of_day(value: Optional[time]) -> int:
+    return -1 if value is None else value.hour * 60 + value.minute
+
+
+class CompiledRules:
+    """Rules flattened into parallel arrays for vectorized matching."""
+
+    # Weight of each scope when picking the most specific rule
+    _MACHINE_WEIGHT, _LINE_WEIGHT, _SHIFT_WEIGHT = 4, 2, 1
+
+    def __init__(self, rules: Sequence[ThresholdRule]):
+        self.rules = tuple(rules)
+        self._kpi_codes = self._codes(rule.kpi_name for rule in self.rules)
+        self._machine_codes = self._codes(rule.machine for rule in self.rules if rule.machine is not None)
+        self._line_codes = self._codes(rule.line for rule in self.rules if rule.line is not None)
+
+        self.kpi = np.array([self._kpi_codes[r.kpi_name] for r in self.rules], dtype=np.int32)
+        self.machine = np.array([self._machine_codes.get(r.machine, -1) for r in self.rules], dtype=np.int32)
+        self.line = np.array([self._line_codes.get(r.line, -1) for r in self.rules], dtype=np.int32)
+        self.shift_start = np.array([_minute_of_day(r.shift_start) for r in self.rules], dtype=np.int32)
+        self.shift_end = np.array([_minute_of_day(r.shift_end) for r in self.rules], dtype=np.int32)
+        self.warning = np.array([r.warning for r in self.rules], dtype=float)
+        self.critical = np.array([r.critical for r in self.rules], dtype=float)
+        self.alert = np.array([r.alert for r in self.rules], dtype=bool)
+
+        specificity = (
+            (self.machine >= 0) * self._MACHINE_WEIGHT
+            + (self.line >= 0) * self._LINE_WEIGHT
+            + (self.shift_start >= 0) * self._SHIFT_WEIGHT
+        )
+        self._priority = specificity * max(len(self.rules), 1) + np.arange(len(self.rules))
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def evaluate(
+        self,
+        kpi_names: Sequence[str],
+        values: Sequence[float],
+        machines: Union[None, str, Sequence[Optional[str]]] = None,
+        lines: Union[None, str, Sequence[Optional[str]]] = None,
+        minutes: Union[None, int, Sequence[int]] = None,
+    ) -> Evaluation:
+        """Evaluate statuses and alert decisions for a batch of KPI values.
+
+        ``machines``, ``lines`` and ``minutes`` (local minute of day) may be
+        scalars shared by the whole batch. Values without a matching rule are
+        reported as 'normal' and never alert.
+        """
+        values = np.asarray(values, dtype=float)
+        n = values.size
+        if not self.rules:
+            return Evaluation(np.full(n, "normal", dtype=STATUSES.dtype), np.zeros(n, dtype=bool),
+                              np.full(n, -1, dtype=np.intp))
+        kpi = self._encode(self._kpi_codes, kpi_names, n)
+        machine = self._encode(self._machine_codes, machines, n)
+        line = self._encode(self._line_codes, lines, n)
+
+        match = kpi[:, None] == self.kpi[None, :]
+        match &= (self.machine < 0) | (machine[:, None] == self.machine)
+        match &= (self.line < 0) | (line[:, None] == self.line)
+        if minutes is not None:
+            minute = np.broadcast_to(np.asarray(minutes, dtype=np.int32), (n,))[:, None]
+            start, end = self.shift_start[None, :], self.shift_end[None, :]
+            in_shift = np.where(start <= end, (minute >= start) & (minute < end), (minute >= start) | (minute < end))
+            match &= (self.shift_start < 0) | in_shift
+        else:
+            match &= self.shift_start < 0
+
+        score = np.where(match, self._priority, -1)
+        rule = score.argmax(axis=1)
+        matched = score.max(axis=1, initial=-1) >= 0
+        rule = np.where(matched, rule, -1)
+
+        warning = np.where(matched, self.warning[rule], -np.inf)
+        critical = np.where(matched, self.critical[rule], -np.inf)
+        level = np.where(values >= warning, 0, np.where(values >= critical, 1, 2))
+        alert = matched & (level > 0) & self.alert[rule]
+        return Evaluation(STATUSES[level], alert, rule)
+
+    @staticmethod
+    def _codes(names) -> Dict[str, int]:
+        codes: Dict[str, int] = {}
+        for name in names:
+            codes.setdefault(name, len(codes))
+        return codes
+
+    @staticmethod
+    def _encode(codes: Dict[str, int], names, n: int) -> np.ndarray:
+        """Map names to rule codes; unknown names get -2, which only wildcards match."""
+        if names is None or isinstance(names, str):
+            return np.full(n, codes.get(names, -2), dtype=np.int32)
+        uniques, inverse = np.unique(np.asarray(names, dtype=object).astype(str), return_inverse=True)
+        lookup = np.array([codes.get(name, -2) for name in uniques], dtype=np.int32)
+        return lookup[inverse.reshape(-1)]
+
+
+class RuleStore:
+    """Threshold rules persisted as JSON and hot-reloaded when the file changes.
+
+    Every process holding a store (API, KPI workers) sees updates written by
+    any other one on its next ``compiled()`` call.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self._mtime: Optional[int] = None
+        self._compiled = CompiledRules(DEFAULT_RULES)
+
+    @property
+    def rules(self) -> List[ThresholdRule]:
+        return list(self.compiled().rules)
+
+    def compiled(self) -> CompiledRules:
+        """Return the compiled rules, reloading them if the file changed."""
+        if self.path:
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except FileNotFoundError:
+                mtime = None
+            if mtime != self._mtime:
+                self.reload()
+        return self._compiled
+
+    def reload(self) -> int:
+        """Re-read the rule file; defaults are used when it does not exist."""
+        if not self.path or not os.path.exists(self.path):
+            self._mtime = None
+            self._compiled = CompiledRules(DEFAULT_RULES)
+            return len(self._compiled)
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+            with open(self.path, encoding="utf-8") as f:
+                rules = [ThresholdRule.from_dict(item) for item in json.load(f)]
+        except Exception as e:
+            # Keep the active rules if the file is invalid
+            logger.error(f"Error loading KPI rules from {self.path}: {str(e)}")
+            return len(self._compiled)
+        self._compiled = CompiledRules(rules)
+        self._mtime = mtime
+        logger.info(f"Loaded {len(rules)} KPI rules from {self.path}")
+        return len(rules)
+
+    def replace(self, rules: Sequence[ThresholdRule]):
+        """Persist a new rule set and make it active immediately."""
+        compiled = CompiledRules(rules)
+        if self.path:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump([rule.to_dict() for rule in rules], f, indent=2)
+            os.replace(tmp_path, self.path)
+            self._mtime = os.stat(self.path).st_mtime_ns
+        self._compiled = compiled
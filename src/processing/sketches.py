@@ -0,0 +1,155 @@
+"""Mergeable quantile sketches for distribution KPIs."""
+import json
+import math
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+DEFAULT_RELATIVE_ACCURACY = 0.01
+
+# Magnitudes below this are counted as zero
+_MIN_INDEXABLE = 1e-9
+
+
+class DDSketch:
+    """DDSketch with relative-error guarantees (Masson et al., VLDB 2019).
+
+    Values are counted in logarithmic buckets of ratio ``gamma``; any
+    quantile estimate ``x'`` of a true quantile ``x`` satisfies
+    ``|x' - x| <= relative_accuracy * |x|``. Sketches with the same accuracy
+    merge exactly by adding bucket counts, so per-bucket sketches can be
+    combined into any larger window.
+    """
+
+    def __init__(self, relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be in (0, 1)")
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.positive: Dict[int, int] = {}
+        self.negative: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value: float):
+        """Add a single value."""
+        self.add_many(np.array([value], dtype=float))
+
+    def add_many(self, values: Iterable[float]):
+        """Add an array of values with one vectorized bucketing pass."""
+        values = np.asarray(values, dtype=float)
+        values = values[np.isfinite(values)]
+        if values.size == 0:
+            return
+        self._add_to_store(self.positive, values[values > _MIN_INDEXABLE])
+        self._add_to_store(self.negative, -values[values < -_MIN_INDEXABLE])
+        self.zero_count += int(np.count_nonzero(np.abs(values) <= _MIN_INDEXABLE))
+        self.count += int(values.size)
+        self.sum += float(values.sum())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+    def merge(self, other: "DDSketch"):
+        """Add the counts of another sketch with the same accuracy."""
+        if not math.isclose(other.relative_accuracy, self.relative_accuracy):
+            raise ValueError("cannot merge sketches with different relative accuracy")
+        for store, other_store in ((self.positive, other.positive), (self.negative, other.negative)):
+            for index, count in other_store.items():
+                store[index] = store.get(index, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate the q-quantile (0 <= q <= 1), or None if empty."""
+        if not 0 <= q <= 1:
+            raise ValueError("q must be in [0, 1]")
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+
+        seen = 0
+        for index in sorted(self.negative, reverse=True):
+            seen += self.negative[index]
+            if seen > rank:
+                return self._clamp(-self._bucket_value(index))
+        seen += self.zero_count
+        if seen > rank:
+            return 0.0
+        for index in sorted(self.positive):
+            seen += self.positive[index]
+            if seen > rank:
+                return self._clamp(self._bucket_value(index))
+        return self.max
+
+    def to_json(self) -> str:
+        return json.dumps({
+            "a": self.relative_accuracy,
+            "p": [[k, v] for k, v in self.positive.items()],
+            "n": [[k, v] for k, v in self.negative.items()],
+            "z": self.zero_count,
+            "c": self.count,
+            "s": self.sum,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+        }, separators=(",", ":"))
+
+    @classmethod
+    def from_json(cls, data: str) -> "DDSketch":
+        raw = json.loads(data)
+        sketch = cls(raw["a"])
+        sketch.positive = {int(k): int(v) for k, v in raw["p"]}
+        sketch.negative = {int(k): int(v) for k, v in raw["n"]}
+        sketch.zero_count = raw["z"]
+        sketch.count = raw["c"]
+        sketch.sum = raw["s"]
+        if sketch.count:
+            sketch.min = raw["min"]
+            sketch.max = raw["max"]
+        return sketch
+
+    def _add_to_store(self, store: Dict[int, int], magnitudes: np.ndarray):
+        if magnitudes.size == 0:
+            return
+        indexes = np.ceil(np.log(magnitudes) / self._log_gamma).astype(np.int64)
+        for index, count in zip(*np.unique(indexes, return_counts=True)):
+            store[int(index)] = store.get(int(index), 0) + int(count)
+
+    def _bucket_value(self, index: int) -> float:
+        # Middle of bucket (gamma^(i-1), gamma^i] in relative terms
+        return 2 * self.gamma ** index / (self.gamma + 1)
+
+    def _clamp(self, value: float) -> float:
+        return min(max(value, self.min), self.max)
+
+
+@dataclass
+class DistributionKPI:
+    """Percentiles of a sensor over a window, with their error bounds."""
+    sensor_id: str
+    start: datetime
+    end: datetime
+    count: int
+    relative_accuracy: float
+    quantiles: Dict[float, Optional[float]] = field(default_factory=dict)
+    min: Optional[float] = None
+    max: Optional[float] = None
+    mean: Optional[float] = None
+
+    def bounds(self, q: float) -> Optional[Tuple[float, float]]:
+        """Interval guaranteed to contain the exact q-quantile."""
+        estimate = self.quantiles.get(q)
+        if estimate is None:
+            return None
+        a = self.relative_accuracy
+        low, high = (estimate / (1 + a), estimate / (1 - a)) if estimate >= 0 else \
+            (estimate / (1 - a), estimate / (1 + a))
+        return max(low, self.min), min(high, self.max)
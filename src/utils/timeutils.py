@@ -0,0 +1,19 @@
+"""Time helpers shared by the processing modules."""
+from datetime import datetime, timedelta, timezone
+
+
+def floor_time(timestamp: datetime, size: timedelta) -> datetime:
+    """Align a timestamp to the start of its fixed-size bucket.
+
+    Buckets are counted from the Unix epoch in the timestamp's own timezone,
+    so naive and aware datetimes are both supported.
+    """
+    epoch = datetime(1970, 1, 1, tzinfo=timestamp.tzinfo)
+    return epoch + ((timestamp - epoch) // size) * size
+
+
+def as_utc(timestamp: datetime) -> datetime:
+    """Return an aware UTC datetime; naive values are assumed to be UTC."""
+    if timestamp.tzinfo is None:
+        return timestamp.replace(tzinfo=timezone.utc)
+    return timestamp.astimezone(timezone.utc)
@@ -4,8 +4,9 @@ from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
 
+from src.alerts.api import app, get_db
 from src.db.database import Base
-from src.db.models import SensorReading, KPIValue, Alert
+from src.db.models import Sensor, SensorReading, KPIValue, Alert
 
 @pytest.fixture(scope="function")
 def test_db():
@@ -23,8 +24,23 @@ def test_db():
     
     # Create test session
     db = TestingSessionLocal()
+    # Serve API requests from the same test database
+    app.dependency_overrides[get_db] = lambda: db
     try:
         yield db
     finally:
+        app.dependency_overrides.pop(get_db, None)
         db.close()
         Base.metadata.drop_all(bind=engine)
+
+@pytest.fixture(scope="function")
+def sensor_keys(test_db):
+    """Register the plant sensors and return their integer keys."""
+    sensors = [
+        Sensor(name="STATUS001", unit="status", machine="M1"),
+        Sensor(name="SPEED001", unit="units/hour", machine="M1"),
+        Sensor(name="QUALITY001", unit="ratio", machine="M1"),
+    ]
+    test_db.add_all(sensors)
+    test_db.commit()
+    return {sensor.name: sensor.id for sensor in sensors}
@@ -0,0 +1,73 @@
+"""Test streaming per-sensor anomaly detection."""
+import json
+import time
+import numpy as np
+from types import SimpleNamespace
+from src.config import Settings
+from src.db.models import Alert
+from src.ingest.anomaly_detector import StreamingAnomalyDetector
+from src.ingest.mqtt_client import MQTTClient
+
+def _feed(detector, sensor_id, values, start=0.0, unit="units/hour"):
+    anomalies = []
+    for i, value in enumerate(values):
+        anomalies += detector.update(sensor_id, value, start + i, unit)
+    return anomalies
+
+def test_spike_detected_once():
+    """Test that a spike raises one alert per episode."""
+    detector = StreamingAnomalyDetector(warmup=20, dropout_seconds=1e9)
+    rng = np.random.default_rng(0)
+    assert _feed(detector, "SPEED001", 80 + rng.normal(0, 1, 100)) == []
+
+    anomalies = _feed(detector, "SPEED001", [200.0, 210.0], start=100)
+    assert [a.kind for a in anomalies] == ["spike"]
+    assert anomalies[0].severity == "critical"
+
+def test_stuck_value_and_discrete_units():
+    """Test stuck detection, skipping on/off sensors."""
+    detector = StreamingAnomalyDetector(stuck_limit=10, dropout_seconds=1e9)
+    anomalies = _feed(detector, "QUALITY001", [0.97] * 30, unit="ratio")
+    assert [a.kind for a in anomalies] == ["stuck"]
+    assert _feed(detector, "STATUS001", [1] * 30, unit="binary") == []
+
+def test_dropout_detected():
+    """Test that silent sensors are reported once."""
+    detector = StreamingAnomalyDetector(dropout_seconds=60, housekeeping_interval=0)
+    detector.update("SPEED001", 80.0, 0.0)
+    detector.update("QUALITY001", 0.9, 0.0)
+    anomalies = _feed(detector, "QUALITY001", [0.91, 0.92], start=100)
+    assert [(a.sensor_id, a.kind) for a in anomalies] == [("SPEED001", "dropout")]
+    assert detector.check_dropouts(120.0) == []
+
+def test_dropout_reported_without_new_messages(test_db):
+    """Test that the ingest watchdog reports dropouts when the broker goes quiet."""
+    detector = StreamingAnomalyDetector(dropout_seconds=0.1, housekeeping_interval=0)
+    client = MQTTClient(settings=Settings(), session_factory=lambda: test_db, detector=detector)
+    message = SimpleNamespace(payload=json.dumps({"sensor_id": "SPEED001", "value": 80.0, "unit": "units/hour"}).encode())
+    client.on_message(None, None, message)
+
+    client.start_watchdog(interval=0.02)
+    try:
+        deadline = time.monotonic() + 2.0
+        while not test_db.query(Alert).count() and time.monotonic() < deadline:
+            time.sleep(0.02)
+    finally:
+        client.stop_watchdog()
+
+    alerts = test_db.query(Alert).all()
+    assert [(a.kpi_name, a.severity) for a in alerts] == [("SPEED001", "critical")]
+
+def test_checkpoint_warm_start(tmp_path):
+    """Test that state survives a restart through the checkpoint."""
+    path = str(tmp_path / "detector.npz")
+    detector = StreamingAnomalyDetector(warmup=20, dropout_seconds=1e9, checkpoint_path=path, initial_capacity=2)
+    rng = np.random.default_rng(1)
+    for sensor in ("A", "B", "C"):
+        _feed(detector, sensor, 50 + rng.normal(0, 1, 50))
+    detector.save_checkpoint()
+
+    restored = StreamingAnomalyDetector(warmup=20, dropout_seconds=1e9, checkpoint_path=path)
+    assert len(restored) == 3
+    # Sin recalentar: el primer valor anómalo ya se detecta
+    assert [a.kind for a in restored.update("B", 500.0, 60.0)] == ["spike"]
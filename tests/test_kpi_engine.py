@@ -4,7 +4,7 @@ from datetime import datetime, timedelta, UTC
 from src.processing.kpi_engine import KPIEngine
 from src.db.models import SensorReading, KPIValue
 
-def test_oee_calculation(test_db):
+def test_oee_calculation(test_db, sensor_keys):
     """Test OEE calculation."""
     # Create test data
     end_time = datetime.now(UTC)
@@ -15,25 +15,22 @@ def test_oee_calculation(test_db):
         # Estado de la máquina (1 = corriendo, 0 = detenida)
         SensorReading(
             time=start_time + timedelta(minutes=i),
-            sensor_id="STATUS001",
-            value=1 if i < 45 else 0,  # 75% disponibilidad
-            unit="status"
+            sensor_key=sensor_keys["STATUS001"],
+            value=1 if i < 45 else 0  # 75% disponibilidad
         ) for i in range(60)
     ] + [
         # Velocidad de producción (90% rendimiento)
         SensorReading(
             time=start_time + timedelta(minutes=i),
-            sensor_id="SPEED001",
-            value=90.0,
-            unit="units/hour"
+            sensor_key=sensor_keys["SPEED001"],
+            value=90.0
         ) for i in range(60)
     ] + [
         # Calidad del producto (98% calidad)
         SensorReading(
             time=start_time + timedelta(minutes=i),
-            sensor_id="QUALITY001",
-            value=0.98,
-            unit="ratio"
+            sensor_key=sensor_keys["QUALITY001"],
+            value=0.98
         ) for i in range(60)
     ]
     
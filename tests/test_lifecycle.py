@@ -0,0 +1,141 @@
+"""Test tiered retention with a Parquet cold archive."""
+import numpy as np
+import pytest
+from datetime import datetime, timedelta, UTC
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from src.db.database import Base
+from src.db.lifecycle import DataLifecycleManager, ParquetArchive
+from src.db.models import Sensor, SensorReading
+from src.processing.kpi_engine import KPIEngine
+
+@pytest.fixture
+def file_db(tmp_path):
+    """SQLite database shared by the lifecycle manager and the KPI engine."""
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'kpi.db'}",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    try:
+        yield engine, db
+    finally:
+        db.close()
+
+def test_archive_is_queried_transparently(file_db, tmp_path):
+    """Test that KPIs are unchanged after old readings move to Parquet."""
+    engine, db = file_db
+    sensors = {name: Sensor(name=name, unit=unit) for name, unit in
+               [("STATUS001", "status"), ("SPEED001", "units/hour"), ("QUALITY001", "ratio")]}
+    db.add_all(sensors.values())
+    db.commit()
+
+    rng = np.random.default_rng(6)
+    start_time = datetime(2024, 1, 1, tzinfo=UTC)
+    for i in range(4 * 24 * 6):  # 4 días, cada 10 minutos
+        t = start_time + timedelta(minutes=10 * i)
+        running = rng.random() > 0.2
+        db.add(SensorReading(time=t, sensor_key=sensors["STATUS001"].id, value=1 if running else 0))
+        db.add(SensorReading(time=t, sensor_key=sensors["SPEED001"].id, value=rng.uniform(60, 100) if running else 0.0))
+        db.add(SensorReading(time=t, sensor_key=sensors["QUALITY001"].id, value=rng.uniform(0.9, 1.0)))
+    db.commit()
+
+    archive = ParquetArchive(str(tmp_path / "archive"))
+    kpis = KPIEngine(db=db, archive=archive)
+    kpis.pane_cache = None
+    end_time = start_time + timedelta(days=4)
+    window = (start_time + timedelta(days=1, hours=20), start_time + timedelta(days=2, hours=3))
+
+    def snapshot():
+        return (
+            kpis.calculate_oee_series(start_time, end_time, timedelta(hours=6)).drop(columns=["start", "end"]),
+            kpis._calculate_performance(*window),
+            kpis.calculate_distribution("SPEED001", *window).quantiles,
+            kpis.export_readings(start_time, end_time)["value"].to_numpy(),
+        )
+
+    before = snapshot()
+    manager = DataLifecycleManager(engine, archive, retention=timedelta(days=2))
+    assert manager.run(now=start_time + timedelta(days=4, hours=12)) == 2
+
+    assert archive.watermark() == start_time + timedelta(days=2)
+    assert db.query(SensorReading).filter(SensorReading.time < start_time + timedelta(days=2)).count() == 0
+    assert (tmp_path / "archive" / "sensor_readings" / "date=2024-01-02" / "readings.parquet").exists()
+
+    after = snapshot()
+    assert np.allclose(after[0].select_dtypes("number"), before[0].select_dtypes("number"))
+    assert (after[0]["OEE_status"] == before[0]["OEE_status"]).all()
+    assert after[1] == pytest.approx(before[1])
+    assert after[2] == before[2]
+    assert np.allclose(after[3], before[3])
+
+    # Una segunda ejecución no vuelve a archivar los mismos días
+    assert manager.run(now=start_time + timedelta(days=4, hours=12)) == 0
+
+def test_archived_panes_read_once(file_db, tmp_path, monkeypatch):
+    """Test that a cold window over archived data reads Parquet once per series and edge."""
+    import pandas as pd
+
+    engine, db = file_db
+    sensors = {name: Sensor(name=name, unit=unit) for name, unit in
+               [("STATUS001", "status"), ("SPEED001", "units/hour"), ("QUALITY001", "ratio")]}
+    db.add_all(sensors.values())
+    db.commit()
+    start_time = datetime(2024, 1, 1, tzinfo=UTC)
+    for i in range(3 * 24 * 60):  # 3 días, cada minuto
+        t = start_time + timedelta(minutes=i)
+        db.add(SensorReading(time=t, sensor_key=sensors["STATUS001"].id, value=1 if i % 5 else 0))
+        db.add(SensorReading(time=t, sensor_key=sensors["SPEED001"].id, value=70.0 + i % 11))
+        db.add(SensorReading(time=t, sensor_key=sensors["QUALITY001"].id, value=0.9 + (i % 7) / 100))
+    db.commit()
+    archive = ParquetArchive(str(tmp_path / "archive"))
+    DataLifecycleManager(engine, archive, retention=timedelta(days=1)).run(now=start_time + timedelta(days=3))
+
+    window = (start_time + timedelta(hours=9, seconds=30), start_time + timedelta(hours=10, seconds=30))
+    direct = KPIEngine(db=db, archive=archive)
+    direct.pane_cache = None
+    expected = [direct._calculate_availability(*window), direct._calculate_performance(*window),
+                direct._calculate_quality(*window)]
+
+    reads = []
+    read_parquet = pd.read_parquet
+    monkeypatch.setattr(pd, "read_parquet", lambda *args, **kwargs: reads.append(args) or read_parquet(*args, **kwargs))
+    cached = KPIEngine(db=db, archive=archive)
+    result = [cached._calculate_availability(*window), cached._calculate_performance(*window),
+              cached._calculate_quality(*window)]
+
+    assert result == pytest.approx(expected)
+    # Por serie: una lectura para todos los paneles y una por borde
+    assert len(reads) <= 3 * 3
+
+def test_interrupted_drop_is_completed(file_db, tmp_path, monkeypatch):
+    """Test that a run finishes dropping days archived before an interruption."""
+    engine, db = file_db
+    sensor = Sensor(name="SPEED001", unit="units/hour")
+    db.add(sensor)
+    db.commit()
+    start_time = datetime(2024, 1, 1, tzinfo=UTC)
+    for i in range(3 * 24):
+        db.add(SensorReading(time=start_time + timedelta(hours=i), sensor_key=sensor.id, value=80.0))
+    db.commit()
+
+    archive = ParquetArchive(str(tmp_path / "archive"))
+    manager = DataLifecycleManager(engine, archive, retention=timedelta(days=2))
+    now = start_time + timedelta(days=3, hours=12)
+
+    # Interrupción después de archivar y avanzar la marca, antes de borrar
+    def crash(watermark):
+        raise RuntimeError("proceso interrumpido")
+    monkeypatch.setattr(manager, "_drop_archived", crash)
+    with pytest.raises(RuntimeError):
+        manager.run(now=now)
+    assert archive.watermark() == start_time + timedelta(days=1)
+    assert db.query(SensorReading).count() == 3 * 24
+
+    monkeypatch.undo()
+    assert manager.run(now=now) == 0
+    assert db.query(SensorReading).filter(SensorReading.time < start_time + timedelta(days=1)).count() == 0
+    assert db.query(SensorReading).count() == 2 * 24
@@ -0,0 +1,121 @@
+"""Test asynchronous alert notification dispatcher."""
+import json
+import pytest
+import time
+from datetime import datetime, timedelta, UTC
+from src.config import get_settings
+from src.processing.kpi_engine import KPIEngine
+from src.alerts.notifications import AlertEvent, FileSink, NotificationDispatcher, NotificationSink, classify_alert
+from src.db.models import Alert, SensorReading
+
+class FlakySink(NotificationSink):
+    """Sink that fails a fixed number of times before succeeding."""
+    destination = "flaky"
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.batches = []
+
+    async def send(self, events):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("unreachable")
+        self.batches.append(list(events))
+
+def _event(i, severity="warning"):
+    return AlertEvent("created", f"KPI{i % 3}", severity, f"alerta {i}")
+
+def test_burst_is_coalesced_into_one_digest(tmp_path):
+    """Test that a burst of events produces a single file digest."""
+    path = tmp_path / "alerts.jsonl"
+    dispatcher = NotificationDispatcher([FileSink(str(path))], coalesce_seconds=0.2, min_interval=0)
+    for i in range(500):
+        dispatcher.publish(_event(i))
+    dispatcher.stop()
+
+    lines = path.read_text().splitlines()
+    assert len(lines) == 1
+    assert json.loads(lines[0])["count"] == 500
+
+def test_failed_sends_are_retried():
+    """Test exponential-backoff retries until the sink recovers."""
+    sink = FlakySink(failures=2)
+    dispatcher = NotificationDispatcher([sink], coalesce_seconds=0.01, min_interval=0, backoff_base=0.01)
+    dispatcher.publish(_event(1, "critical"))
+    dispatcher.stop()
+    assert len(sink.batches) == 1
+    assert dispatcher.failed == 0
+
+def test_gives_up_after_max_retries():
+    """Test that undeliverable events are counted as failed."""
+    sink = FlakySink(failures=10)
+    dispatcher = NotificationDispatcher([sink], coalesce_seconds=0.01, min_interval=0,
+                                        max_retries=2, backoff_base=0.01)
+    dispatcher.publish(_event(1))
+    dispatcher.stop()
+    assert sink.batches == []
+    assert dispatcher.failed == 1
+
+def test_sustained_burst_is_rate_limited():
+    """Test that a sustained burst is merged into one digest per rate-limit interval."""
+    sink = FlakySink(failures=0)
+    dispatcher = NotificationDispatcher([sink], coalesce_seconds=0.05, min_interval=0.3)
+    started = time.monotonic()
+    published = 0
+    while time.monotonic() - started < 1.5:
+        dispatcher.publish(_event(published))
+        published += 1
+        time.sleep(0.005)
+    dispatcher.stop()
+    elapsed = time.monotonic() - started
+
+    # 1.5 s / 0.3 s plus the final flush on stop
+    assert len(sink.batches) <= 7
+    assert sum(len(batch) for batch in sink.batches) == published
+    assert elapsed < 2.5
+
+def test_classify_escalation(test_db):
+    """Test that a critical alert after an open warning is an escalation."""
+    assert classify_alert(test_db, "OEE", "critical") == "created"
+    test_db.add(Alert(kpi_name="OEE", severity="warning", message="OEE bajo"))
+    test_db.commit()
+    assert classify_alert(test_db, "OEE", "critical") == "escalated"
+    assert classify_alert(test_db, "OEE", "warning") == "created"
+
+def test_kpi_alert_reaches_configured_sink(test_db, sensor_keys, tmp_path, monkeypatch):
+    """Test that KPIEngine notifies the sinks configured in settings by default."""
+    path = tmp_path / "alerts.jsonl"
+    monkeypatch.setenv("NOTIFY_FILE_PATH", str(path))
+    monkeypatch.setenv("NOTIFY_COALESCE_SECONDS", "0.01")
+    get_settings.cache_clear()
+    try:
+        engine = KPIEngine()
+    finally:
+        get_settings.cache_clear()
+    engine.db = test_db
+
+    # Máquina detenida toda la hora: OEE crítico
+    end_time = datetime.now(UTC)
+    start_time = end_time - timedelta(hours=1)
+    for i in range(60):
+        test_db.add(SensorReading(time=start_time + timedelta(minutes=i),
+                                  sensor_key=sensor_keys["STATUS001"], value=0))
+    test_db.commit()
+    engine.calculate_oee(start_time, end_time)
+    engine.close()
+
+    events = [event for line in path.read_text().splitlines() for event in json.loads(line)["events"]]
+    assert "OEE" in {event["kpi_name"] for event in events}
+    assert all(event["severity"] == "critical" for event in events)
+
+def test_stop_counts_undelivered_events():
+    """Test that events still being retried when stop times out are counted as failed."""
+    sink = FlakySink(failures=100)
+    dispatcher = NotificationDispatcher([sink], coalesce_seconds=0.01, min_interval=0, backoff_base=0.2)
+    assert dispatcher.retry_seconds() == pytest.approx(0.2 + 0.4 + 0.8 + 1.6 + 3.2)
+    for i in range(3):
+        dispatcher.publish(_event(i))
+    time.sleep(0.1)
+    dispatcher.stop(timeout=0.3)
+    assert sink.batches == []
+    assert dispatcher.failed == 3
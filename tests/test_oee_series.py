@@ -0,0 +1,63 @@
+"""Test vectorized historical OEE series."""
+import pytest
+import random
+from sqlalchemy import event
+from datetime import datetime, timedelta, UTC
+from src.processing.kpi_engine import KPIEngine
+from src.db.models import SensorReading
+
+def test_oee_series_matches_per_window(test_db, sensor_keys):
+    """Test that the series matches calculate_oee window by window."""
+    rng = random.Random(7)
+    start_time = datetime(2024, 1, 1, 6, 0, tzinfo=UTC)
+    for i in range(240):
+        t = start_time + timedelta(minutes=i)
+        running = rng.random() > 0.2
+        test_db.add(SensorReading(time=t, sensor_key=sensor_keys["STATUS001"], value=1 if running else 0))
+        test_db.add(SensorReading(time=t, sensor_key=sensor_keys["SPEED001"], value=rng.uniform(60, 100) if running else 0.0))
+        test_db.add(SensorReading(time=t, sensor_key=sensor_keys["QUALITY001"], value=rng.uniform(0.9, 1.0)))
+    test_db.commit()
+
+    engine = KPIEngine()
+    engine.db = test_db
+    end_time = start_time + timedelta(hours=4, minutes=7)
+    step = timedelta(minutes=15)
+
+    # Bloques pequeños para forzar cortes entre lecturas simultáneas
+    series = engine.calculate_oee_series(start_time, end_time, step, chunk_size=50)
+    assert len(series) == 17
+
+    engine.pane_cache = None
+    for row in series.itertuples():
+        window_start = row.start.to_pydatetime()
+        window_end = row.end.to_pydatetime()
+        assert row.availability == pytest.approx(engine._calculate_availability(window_start, window_end))
+        assert row.performance == pytest.approx(engine._calculate_performance(window_start, window_end))
+        assert row.quality == pytest.approx(engine._calculate_quality(window_start, window_end))
+        assert row.OEE == pytest.approx(engine.calculate_oee(window_start, window_end))
+        assert row.OEE_status == engine.evaluate_kpis(["OEE"], [row.OEE], window_end).status[0]
+
+def test_oee_series_without_data(test_db, sensor_keys):
+    """Test that empty windows default like the per-window method."""
+    engine = KPIEngine()
+    engine.db = test_db
+    start_time = datetime(2024, 1, 1, tzinfo=UTC)
+    series = engine.calculate_oee_series(start_time, start_time + timedelta(hours=1), timedelta(minutes=30))
+    assert len(series) == 2
+    assert (series["OEE"] == 1.0).all()
+    assert (series["OEE_status"] == "normal").all()
+
+def test_chunked_read_uses_server_side_cursor(test_db, sensor_keys):
+    """Test that chunked reads ask the driver to stream results."""
+    streamed = []
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if "FROM sensor_readings" in statement:
+            streamed.append(context.execution_options.get("stream_results", False))
+    event.listen(test_db.get_bind(), "before_cursor_execute", record)
+    try:
+        engine = KPIEngine(db=test_db)
+        start_time = datetime(2024, 1, 1, tzinfo=UTC)
+        engine.calculate_oee_series(start_time, start_time + timedelta(hours=1), timedelta(minutes=30), chunk_size=10)
+    finally:
+        event.remove(test_db.get_bind(), "before_cursor_execute", record)
+    assert streamed and all(streamed)
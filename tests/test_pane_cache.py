@@ -0,0 +1,154 @@
+"""Test pane-based aggregate cache for sliding windows."""
+import pytest
+from sqlalchemy import event
+from datetime import datetime, timedelta, UTC
+from zoneinfo import ZoneInfo
+from src.processing.kpi_engine import KPIEngine
+from src.processing.pane_cache import PaneAggregate, PaneCache
+from src.db.models import SensorReading
+
+def _add_readings(test_db, sensor_keys, start_time, minutes):
+    """Crea lecturas de estado, velocidad y calidad cada 30 segundos."""
+    for i in range(minutes * 2):
+        t = start_time + timedelta(seconds=30 * i)
+        test_db.add(SensorReading(time=t, sensor_key=sensor_keys["STATUS001"], value=1 if i % 4 else 0))
+        test_db.add(SensorReading(time=t, sensor_key=sensor_keys["SPEED001"], value=60.0 + i % 7))
+        test_db.add(SensorReading(time=t, sensor_key=sensor_keys["QUALITY001"], value=0.9 + (i % 5) / 100))
+    test_db.commit()
+
+def test_pane_cache_lru_eviction():
+    """Test that the least recently used pane is evicted first."""
+    cache = PaneCache(pane_size=timedelta(minutes=1), max_panes=2)
+    t0 = datetime(2024, 1, 1, tzinfo=UTC)
+    cache.put("A", t0, PaneAggregate(1, 1.0, 1))
+    cache.put("A", t0 + timedelta(minutes=1), PaneAggregate(2, 2.0, 2))
+    assert cache.get("A", t0) is not None
+    cache.put("A", t0 + timedelta(minutes=2), PaneAggregate(3, 3.0, 3))
+    assert len(cache) == 2
+    assert cache.get("A", t0) is not None
+    assert cache.get("A", t0 + timedelta(minutes=1)) is None
+
+def test_sliding_window_matches_uncached(test_db, sensor_keys):
+    """Test that cached sliding windows match direct aggregation."""
+    start_time = datetime(2024, 1, 1, 8, 0, 7, tzinfo=UTC)
+    _add_readings(test_db, sensor_keys, start_time, 90)
+
+    cached = KPIEngine()
+    cached.db = test_db
+    direct = KPIEngine()
+    direct.db = test_db
+    direct.pane_cache = None
+
+    window = timedelta(hours=1)
+    for slide in range(0, 30, 5):
+        end_time = start_time + window + timedelta(minutes=slide, seconds=13)
+        begin = end_time - window
+        assert cached._calculate_availability(begin, end_time) == pytest.approx(direct._calculate_availability(begin, end_time))
+        assert cached._calculate_performance(begin, end_time) == pytest.approx(direct._calculate_performance(begin, end_time))
+        assert cached._calculate_quality(begin, end_time) == pytest.approx(direct._calculate_quality(begin, end_time))
+
+def test_slide_only_computes_new_panes(test_db, sensor_keys):
+    """Test that sliding by one pane only aggregates the new pane."""
+    start_time = datetime(2024, 1, 1, 8, 0, 0, tzinfo=UTC)
+    _add_readings(test_db, sensor_keys, start_time, 70)
+
+    engine = KPIEngine(pane_cache=PaneCache(pane_size=timedelta(minutes=1)))
+    engine.db = test_db
+    end_time = start_time + timedelta(hours=1)
+    engine._calculate_quality(end_time - timedelta(hours=1), end_time)
+    assert engine.pane_cache.misses == 60
+
+    end_time += timedelta(minutes=1)
+    engine._calculate_quality(end_time - timedelta(hours=1), end_time)
+    assert engine.pane_cache.misses == 61
+    assert engine.pane_cache.hits == 59
+
+def _windows_with_query_count(engine, test_db, start_time, end_time):
+    """Calcula los tres componentes y devuelve (resultados, consultas ejecutadas)."""
+    statements = []
+    def record(*args):
+        statements.append(args[2])
+    event.listen(test_db.get_bind(), "before_cursor_execute", record)
+    try:
+        results = (
+            engine._calculate_availability(start_time, end_time),
+            engine._calculate_performance(start_time, end_time),
+            engine._calculate_quality(start_time, end_time)
+        )
+    finally:
+        event.remove(test_db.get_bind(), "before_cursor_execute", record)
+    return results, len(statements)
+
+@pytest.mark.parametrize("days", [1, 7])
+def test_long_window_query_count(test_db, sensor_keys, days):
+    """Test that cold and repeated multi-day windows issue a bounded number of queries."""
+    start_time = datetime(2024, 1, 1, 0, 0, 7, tzinfo=UTC)
+    _add_readings(test_db, sensor_keys, start_time, 60)
+    end_time = start_time + timedelta(days=days)
+
+    direct = KPIEngine(pane_cache=None)
+    direct.db = test_db
+    expected, _ = _windows_with_query_count(direct, test_db, start_time, end_time)
+
+    engine = KPIEngine()
+    engine.db = test_db
+    cold, cold_queries = _windows_with_query_count(engine, test_db, start_time, end_time)
+    warm, warm_queries = _windows_with_query_count(engine, test_db, start_time, end_time)
+
+    assert cold == pytest.approx(expected)
+    assert warm == pytest.approx(expected)
+    # Por serie: una consulta agrupada para los paneles y una por borde,
+    # más la resolución inicial de claves de sensores
+    assert cold_queries <= 3 * 3 + 3
+    # Repetida, solo se consultan los bordes (o la ventana entera si no cabe en caché)
+    assert warm_queries <= 3 * 2
+
+def test_multi_day_slide_keeps_each_series_cached():
+    """Test that series sharing the cache do not evict each other's multi-day windows."""
+    cache = PaneCache(pane_size=timedelta(minutes=1), lateness=timedelta(0))
+    empty = lambda *args: PaneAggregate()
+    no_panes = lambda lower, upper: {}
+    end_time = datetime(2024, 1, 5, tzinfo=UTC)
+    window = timedelta(days=4)
+
+    for slide in range(3):
+        end = end_time + timedelta(minutes=slide)
+        for key in ("STATUS001", "SPEED001", "QUALITY001"):
+            cache.aggregate(key, end - window, end, empty, no_panes, now=end_time + timedelta(days=1))
+
+    assert cache.misses == 3 * 4 * 24 * 60 + 3 * 2
+    assert cache.hits == 3 * 2 * (4 * 24 * 60 - 1)
+
+def test_recent_panes_are_not_cached(test_db, sensor_keys):
+    """Test that panes still open to late readings are recomputed on every call."""
+    end_time = datetime.now(UTC).replace(second=0, microsecond=0)
+    start_time = end_time - timedelta(minutes=30)
+    engine = KPIEngine(pane_cache=PaneCache(lateness=timedelta(minutes=5)))
+    engine.db = test_db
+    assert engine._calculate_quality(start_time, end_time) == 1.0
+
+    # Lectura tardía dentro de un panel reciente ya agregado
+    test_db.add(SensorReading(time=end_time - timedelta(seconds=30), sensor_key=sensor_keys["QUALITY001"], value=0.5))
+    test_db.commit()
+    assert engine._calculate_quality(start_time, end_time) == pytest.approx(0.5)
+    assert engine.pane_cache.misses == 30 + 5
+
+@pytest.mark.parametrize("zone", ["Asia/Kolkata", "America/New_York"])
+def test_local_time_windows_match_uncached(test_db, sensor_keys, zone):
+    """Test that windows in non-UTC and DST zones align to the same UTC panes."""
+    start_time = datetime(2024, 3, 9, 20, 0, 7, tzinfo=UTC)
+    _add_readings(test_db, sensor_keys, start_time, 12 * 60)
+
+    cached = KPIEngine(pane_cache=PaneCache(pane_size=timedelta(hours=1)))
+    cached.db = test_db
+    direct = KPIEngine(pane_cache=None)
+    direct.db = test_db
+
+    tz = ZoneInfo(zone)
+    for hours in (3, 7, 11):
+        begin = start_time + timedelta(minutes=17)
+        end_time = start_time + timedelta(hours=hours, minutes=41)
+        # Referencia con los mismos instantes en UTC (SQLite compara las fechas como texto)
+        local = (begin.astimezone(tz), end_time.astimezone(tz))
+        assert cached._calculate_quality(*local) == pytest.approx(direct._calculate_quality(begin, end_time))
+        assert cached._calculate_performance(*local) == pytest.approx(direct._calculate_performance(begin, end_time))
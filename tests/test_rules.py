@@ -0,0 +1,82 @@
+"""Test configurable KPI threshold and alert rules."""
+import numpy as np
+import pytest
+from datetime import datetime, time, timedelta, UTC
+from fastapi.testclient import TestClient
+from src.alerts.api import app, get_rule_store
+from src.db.models import Alert, KPIValue
+from src.processing.kpi_engine import KPIEngine
+from src.processing.rules import DEFAULT_RULES, CompiledRules, RuleStore, ThresholdRule
+
+client = TestClient(app)
+
+def _scalar_status(value, warning, critical):
+    if value >= warning:
+        return "normal"
+    return "warning" if value >= critical else "critical"
+
+def test_batch_matches_scalar_thresholds():
+    """Test that a vectorized pass matches per-value evaluation."""
+    rng = np.random.default_rng(8)
+    names = rng.choice(["OEE", "availability", "performance", "quality", "MTBF"], 5000)
+    values = rng.uniform(0.5, 1.0, 5000)
+    evaluation = CompiledRules(DEFAULT_RULES).evaluate(names, values)
+
+    thresholds = {rule.kpi_name: rule for rule in DEFAULT_RULES}
+    for name, value, status, alert in zip(names, values, evaluation.status, evaluation.alert):
+        rule = thresholds.get(name)
+        expected = _scalar_status(value, rule.warning, rule.critical) if rule else "normal"
+        assert status == expected
+        assert alert == (name == "OEE" and expected != "normal")
+
+def test_most_specific_rule_wins():
+    """Test machine and overnight-shift overrides."""
+    rules = CompiledRules([
+        ThresholdRule("OEE", warning=0.85, critical=0.75),
+        ThresholdRule("OEE", warning=0.70, critical=0.60, machine="M2"),
+        ThresholdRule("OEE", warning=0.50, critical=0.40, shift_start=time(22, 0), shift_end=time(6, 0)),
+    ])
+    evaluation = rules.evaluate(["OEE"] * 4, [0.72] * 4,
+                                machines=["M1", "M2", "M1", "M3"],
+                                minutes=[12 * 60, 12 * 60, 23 * 60, 3 * 60])
+    assert evaluation.status.tolist() == ["critical", "normal", "normal", "normal"]
+    assert evaluation.rule.tolist() == [0, 1, 2, 2]
+
+def test_invalid_rule_rejected():
+    """Test that inverted thresholds are rejected."""
+    with pytest.raises(ValueError):
+        ThresholdRule("OEE", warning=0.5, critical=0.8)
+
+def test_store_hot_reload(tmp_path):
+    """Test that another process' store sees replaced rules."""
+    path = str(tmp_path / "rules.json")
+    writer, reader = RuleStore(path), RuleStore(path)
+    assert len(reader.rules) == len(DEFAULT_RULES)
+    writer.replace([ThresholdRule("OEE", warning=0.6, critical=0.5, line="L1", shift_start=time(6), shift_end=time(14))])
+    assert reader.rules == writer.rules
+    assert reader.rules[0].shift_start == time(6)
+
+def test_rules_api_and_engine_alerts(test_db, sensor_keys, tmp_path):
+    """Test replacing rules through the API and alerting on them."""
+    store = RuleStore(str(tmp_path / "rules.json"))
+    app.dependency_overrides[get_rule_store] = lambda: store
+    try:
+        response = client.put("/rules/", json=[
+            {"kpi_name": "OEE", "warning": 0.85, "critical": 0.75},
+            {"kpi_name": "quality", "warning": 0.98, "critical": 0.95},
+        ])
+        assert response.status_code == 200
+        assert client.get("/rules/").json()[1]["alert"] is True
+        assert client.put("/rules/", json=[{"kpi_name": "OEE", "warning": 0.5, "critical": 0.9}]).status_code == 422
+        assert client.post("/rules/reload").json()["count"] == 2
+    finally:
+        app.dependency_overrides.pop(get_rule_store, None)
+
+    # Sin lecturas: todos los KPIs en 100% salvo la regla de calidad modificada
+    engine = KPIEngine(db=test_db, rules=RuleStore(store.path))
+    engine.rules.replace(engine.rules.rules + [ThresholdRule("quality", warning=1.5, critical=1.2)])
+    end_time = datetime.now(UTC)
+    engine.calculate_oee(end_time - timedelta(minutes=5), end_time)
+    alerts = test_db.query(Alert).all()
+    assert [(a.kpi_name, a.severity) for a in alerts] == [("quality", "critical")]
+    assert test_db.query(KPIValue).filter(KPIValue.kpi_name == "quality").one().status == "critical"
@@ -0,0 +1,52 @@
+"""Test sensor dimension table and interning cache."""
+from datetime import datetime, timedelta, UTC
+from src.db.models import Alert, Sensor, SensorReading
+from src.db.sensor_registry import SensorRegistry
+from src.processing.kpi_engine import KPIEngine
+
+def test_get_or_create_interns_sensors(test_db):
+    """Test that each external id is registered once and then cached."""
+    registry = SensorRegistry()
+    key = registry.get_or_create(test_db, "TEMP001", "celsius", "M2")
+    assert registry.get_or_create(test_db, "TEMP001", "celsius", "M2") == key
+    test_db.commit()
+    assert test_db.query(Sensor).count() == 1
+
+    # Otro proceso resuelve la misma clave desde la base de datos
+    other = SensorRegistry()
+    assert other.get_or_create(test_db, "TEMP001", "celsius") == key
+    assert other.key_for(test_db, "UNKNOWN") is None
+
+def test_export_resolves_sensor_names(test_db, sensor_keys):
+    """Test that exports show external ids and units, not integer keys."""
+    start_time = datetime(2024, 1, 1, tzinfo=UTC)
+    for i in range(3):
+        test_db.add(SensorReading(time=start_time + timedelta(minutes=i), sensor_key=sensor_keys["SPEED001"], value=80.0 + i))
+        test_db.add(SensorReading(time=start_time + timedelta(minutes=i), sensor_key=sensor_keys["STATUS001"], value=1))
+    test_db.commit()
+
+    engine = KPIEngine(db=test_db)
+    readings = engine.export_readings(start_time, start_time + timedelta(hours=1), sensor_ids=["SPEED001"])
+    assert list(readings.columns) == ["time", "sensor_id", "value", "unit", "machine"]
+    assert (readings["sensor_id"] == "SPEED001").all()
+    assert (readings["unit"] == "units/hour").all()
+    assert readings["value"].tolist() == [80.0, 81.0, 82.0]
+
+def test_rolled_back_registration_is_not_cached(test_db):
+    """Test that a sensor key is only cached once its registration commits."""
+    registry = SensorRegistry()
+    # pysqlite solo abre la transacción con la primera escritura; sin ella el savepoint confirmaría
+    test_db.add(Alert(kpi_name="OEE", severity="warning", message="OEE bajo"))
+    test_db.flush()
+    key = registry.get_or_create(test_db, "TEMP001", "celsius")
+    assert registry.get_or_create(test_db, "TEMP001", "celsius") == key
+    assert len(registry) == 0
+    test_db.rollback()
+    assert test_db.query(Sensor).count() == 0
+
+    # Se vuelve a registrar en lugar de devolver la clave anulada
+    key = registry.get_or_create(test_db, "TEMP001", "celsius")
+    test_db.add(SensorReading(time=datetime(2024, 1, 1, tzinfo=UTC), sensor_key=key, value=21.5))
+    test_db.commit()
+    assert len(registry) == 1
+    assert test_db.query(Sensor).one().id == key
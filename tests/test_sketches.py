@@ -0,0 +1,118 @@
+"""Test mergeable quantile sketches and distribution KPIs."""
+import numpy as np
+import pytest
+from datetime import datetime, timedelta, UTC
+from src.db.models import SensorReading, SensorSketch
+from src.processing.kpi_engine import KPIEngine
+from src.processing.sketches import DDSketch
+from src.utils.timeutils import as_utc
+
+def _exact_quantile(values, q):
+    return np.sort(values)[int(np.floor(q * (len(values) - 1)))]
+
+def test_quantiles_within_relative_error():
+    """Test that every estimate is within the relative accuracy."""
+    values = np.random.default_rng(3).lognormal(4, 1, 20_000)
+    sketch = DDSketch(0.01)
+    sketch.add_many(values)
+    for q in (0.0, 0.5, 0.95, 0.99, 1.0):
+        exact = _exact_quantile(values, q)
+        assert abs(sketch.quantile(q) - exact) <= 0.01 * exact
+
+def test_merge_equals_union_and_roundtrip():
+    """Test that merging bucket sketches equals sketching all values."""
+    rng = np.random.default_rng(4)
+    parts = [rng.normal(0, 10, 1000) for _ in range(5)]
+    merged = DDSketch()
+    for part in parts:
+        sketch = DDSketch()
+        sketch.add_many(part)
+        merged.merge(DDSketch.from_json(sketch.to_json()))
+    whole = DDSketch()
+    whole.add_many(np.concatenate(parts))
+    assert merged.count == whole.count == 5000
+    for q in (0.01, 0.5, 0.99):
+        assert merged.quantile(q) == whole.quantile(q)
+
+def test_distribution_kpi_uses_bucket_sketches(test_db, sensor_keys):
+    """Test window percentiles from stored sketches plus raw edges."""
+    rng = np.random.default_rng(5)
+    start_time = datetime(2024, 1, 1, 6, 0, tzinfo=UTC)
+    speeds = rng.uniform(60, 100, 600)
+    for i, speed in enumerate(speeds):
+        test_db.add(SensorReading(time=start_time + timedelta(seconds=10 * i), sensor_key=sensor_keys["SPEED001"], value=speed))
+    test_db.commit()
+
+    engine = KPIEngine(db=test_db)
+    window_start = start_time + timedelta(minutes=3, seconds=5)
+    window_end = start_time + timedelta(minutes=87, seconds=42)
+    result = engine.calculate_distribution("SPEED001", window_start, window_end)
+
+    # 16 buckets completos de 5 minutos dentro de la ventana
+    assert test_db.query(SensorSketch).count() == 16
+    inside = speeds[(np.arange(600) * 10 >= 185) & (np.arange(600) * 10 <= 87 * 60 + 42)]
+    assert result.count == len(inside)
+    for q in (0.5, 0.95, 0.99):
+        low, high = result.bounds(q)
+        assert low <= _exact_quantile(inside, q) <= high
+
+    # Segunda consulta: se reutilizan los sketches guardados
+    again = engine.calculate_distribution("SPEED001", window_start, window_end)
+    assert test_db.query(SensorSketch).count() == 16
+    assert again.quantiles == result.quantiles
+
+def test_extended_window_skips_stored_buckets(test_db, sensor_keys):
+    """Test that widening a window on both sides only reads raw data outside stored buckets."""
+    start_time = datetime(2024, 1, 1, 6, 0, tzinfo=UTC)
+    for i in range(720):
+        test_db.add(SensorReading(time=start_time + timedelta(seconds=10 * i), sensor_key=sensor_keys["SPEED001"], value=60 + i % 40))
+    test_db.commit()
+
+    engine = KPIEngine(db=test_db)
+    stored_start = start_time + timedelta(minutes=40)
+    stored_end = start_time + timedelta(minutes=80)
+    engine.calculate_distribution("SPEED001", stored_start, stored_end)
+
+    fetched = []
+    fetch_values = engine._fetch_values
+    def record(sensor_key, lower, upper, include_upper):
+        fetched.append((lower, upper))
+        return fetch_values(sensor_key, lower, upper, include_upper)
+    engine._fetch_values = record
+
+    result = engine.calculate_distribution("SPEED001", start_time, start_time + timedelta(minutes=119, seconds=50))
+    assert result.count == 720
+    assert fetched
+    assert all(upper <= stored_start or lower >= stored_end for lower, upper in fetched)
+
+def test_recent_buckets_wait_for_late_readings(test_db, sensor_keys):
+    """Test that buckets are not stored until the late-reading grace period has passed."""
+    end_time = datetime.now(UTC).replace(second=0, microsecond=0)
+    start_time = end_time - timedelta(minutes=30)
+    for i in range(180):
+        test_db.add(SensorReading(time=start_time + timedelta(seconds=10 * i), sensor_key=sensor_keys["SPEED001"], value=70.0))
+    test_db.commit()
+
+    engine = KPIEngine(db=test_db)
+    engine.sketch_grace = timedelta(minutes=12)
+    engine.calculate_distribution("SPEED001", start_time, end_time)
+    stored_until = max(as_utc(row.bucket_start) for row in test_db.query(SensorSketch))
+    assert stored_until + engine.sketch_bucket <= end_time - engine.sketch_grace
+
+def test_stale_sketch_is_rebuilt(test_db, sensor_keys):
+    """Test that a stored sketch missing late readings is rebuilt from raw data."""
+    start_time = datetime(2024, 1, 1, 6, 0, tzinfo=UTC)
+    for i in range(60):
+        test_db.add(SensorReading(time=start_time + timedelta(seconds=10 * i), sensor_key=sensor_keys["SPEED001"], value=70.0))
+    test_db.commit()
+    engine = KPIEngine(db=test_db)
+    end_time = start_time + timedelta(minutes=10)
+    assert engine.calculate_distribution("SPEED001", start_time, end_time).count == 60
+
+    # Lectura tardía, confirmada después de guardar el sketch de su bucket
+    test_db.add(SensorReading(time=start_time + timedelta(minutes=4, seconds=55), sensor_key=sensor_keys["SPEED001"], value=500.0))
+    test_db.commit()
+    result = engine.calculate_distribution("SPEED001", start_time, end_time)
+    assert result.count == 61
+    assert result.max == pytest.approx(500.0, rel=0.01)
+    assert sorted(row.count for row in test_db.query(SensorSketch)) == [30, 31]